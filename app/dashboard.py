@@ -12,6 +12,9 @@ import pandas as pd
 import streamlit as st
 
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+from feature_store import FeatureStore, feature_store_path
+
 ARTIFACTS = ROOT / "artifacts"
 DATASET_DIR = ROOT / "dataset"
 
@@ -61,6 +64,19 @@ def load_artifacts():
     return scaler, kmeans, churn_model, ltv_model
 
 
+@st.cache_resource
+def _open_feature_store(path: str, mtime: float) -> FeatureStore:
+    return FeatureStore.open(Path(path))
+
+
+def load_feature_store() -> Optional[FeatureStore]:
+    path = feature_store_path(ARTIFACTS)
+    if path is None:
+        return None
+    # Keyed on mtime so a retrain is picked up without re-reading on every rerun.
+    return _open_feature_store(str(path), path.stat().st_mtime)
+
+
 def predict(features: pd.DataFrame) -> Dict[str, float]:
     scaler, kmeans, churn_model, ltv_model = load_artifacts()
     segment = int(kmeans.predict(scaler.transform(features[SEGMENT_COLS]))[0])
@@ -96,6 +112,23 @@ if report_path.exists():
 else:
     st.info("No report yet. Run training.")
 
+st.subheader("Predict (Customer ID)")
+store = load_feature_store()
+if store is None:
+    st.info("No feature store found. Run training first.")
+else:
+    customer_id = st.number_input("CustomerID", min_value=0, step=1)
+    if st.button("Look up & Predict"):
+        row = store.lookup(int(customer_id))
+        if row.empty:
+            st.warning("Customer not found in the feature store.")
+        else:
+            st.dataframe(row)
+            try:
+                st.success(predict(row))
+            except Exception as exc:
+                st.error(str(exc))
+
 st.subheader("Predict (Manual Features)")
 with st.form("predict_form"):
     cols = st.columns(4)
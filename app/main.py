@@ -1,16 +1,17 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
 import sys
 from typing import Optional
 import uuid
-import subprocess
 import os
 
 import joblib
 import pandas as pd
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header, Body, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from fastapi.responses import FileResponse
@@ -37,8 +38,19 @@ from firestore_client import (
     update_prediction,
     delete_prediction,
 )
-from storage import get_b2_client, download_file, presign_download_url, parse_b2_url
+from storage import (
+    get_b2_client,
+    download_dataset,
+    download_file,
+    presign_download_url,
+    parse_b2_url,
+    upload_dataset_columnar,
+)
+from columnar import EXCEL_SUFFIXES, excel_as_columnar
+from data_pipeline import load_raw_transactions
+from feature_store import FEATURE_STORE_CSV, FEATURE_STORE_FILE, FeatureStore, feature_store_path
 from notifications import build_prediction_complete_email
+from training_pool import CANCELLED, PoolFull, TrainingJob, TrainingPool
 from email_queue_client import enqueue_email_via_frontend
 from pydantic import BaseModel, Field
 
@@ -123,6 +135,39 @@ class PredictionUpdate(BaseModel):
 app = FastAPI(title="Customer Segmentation & Retention API")
 load_dotenv()
 
+# Warm training workers shared by /train requests; started with the app.
+training_pool: Optional[TrainingPool] = None
+
+
+@app.on_event("startup")
+def start_training_pool() -> None:
+    global training_pool
+    training_pool = TrainingPool(
+        workers=int(os.getenv("TRAIN_WORKERS", "1")),
+        max_queued=int(os.getenv("TRAIN_QUEUE_SIZE", "8")),
+        on_finish=_record_cancelled_training,
+    )
+
+
+def _record_cancelled_training(job: TrainingJob) -> None:
+    # Completed and failed runs update their queue entry from train_pipeline;
+    # only a run that was actually stopped is marked cancelled here.
+    if job.status == CANCELLED and job.queue_id:
+        update_queue_job(job.tenant_id, job.queue_id, {"status": "cancelled"})
+
+
+def _training_pool() -> TrainingPool:
+    # Set by the startup hook; requests can arrive before it has run.
+    if training_pool is None:
+        raise HTTPException(status_code=503, detail="Training pool not started", headers={"Retry-After": "5"})
+    return training_pool
+
+
+@app.on_event("shutdown")
+def stop_training_pool() -> None:
+    if training_pool is not None:
+        training_pool.shutdown()
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
@@ -172,18 +217,29 @@ async def upload_dataset(
     filename = Path(file.filename).name
     content = await file.read()
 
+    # Blocking calls (client setup, storage and disk I/O, conversion) run in the
+    # threadpool so they do not stall the event loop.
     b2_bucket = os.getenv("B2_BUCKET")
-    client = get_b2_client()
+    client = await run_in_threadpool(get_b2_client)
     if client and b2_bucket:
         upload_id = str(uuid.uuid4())
         base_prefix = f"tenants/{tenant_id}/datasets/{upload_id}"
         dataset_key = f"{base_prefix}/{filename}"
-        client.put_object(Bucket=b2_bucket, Key=dataset_key, Body=content)
+        await run_in_threadpool(client.put_object, Bucket=b2_bucket, Key=dataset_key, Body=content)
         dataset_path = f"b2://{b2_bucket}/{dataset_key}"
+        if Path(filename).suffix.lower() in EXCEL_SUFFIXES:
+            local_copy = ROOT / "artifacts_cache" / tenant_id / "datasets" / upload_id / filename
+            local_copy.parent.mkdir(parents=True, exist_ok=True)
+            await run_in_threadpool(local_copy.write_bytes, content)
+            try:
+                await run_in_threadpool(upload_dataset_columnar, client, b2_bucket, dataset_key, local_copy)
+            except Exception as exc:
+                print(f"[upload] columnar conversion failed: {exc}")
         mapping_path = None
         if mapping:
             mapping_key = f"{base_prefix}/mapping.json"
-            client.put_object(
+            await run_in_threadpool(
+                client.put_object,
                 Bucket=b2_bucket,
                 Key=mapping_key,
                 Body=mapping.encode("utf-8"),
@@ -198,11 +254,16 @@ async def upload_dataset(
     tenant_dir = ROOT / "dataset" / "tenants" / tenant_id
     tenant_dir.mkdir(parents=True, exist_ok=True)
     dataset_path = tenant_dir / filename
-    dataset_path.write_bytes(content)
+    await run_in_threadpool(dataset_path.write_bytes, content)
+    if dataset_path.suffix.lower() in EXCEL_SUFFIXES:
+        try:
+            await run_in_threadpool(excel_as_columnar, dataset_path)
+        except Exception as exc:
+            print(f"[upload] columnar conversion failed: {exc}")
     mapping_path = None
     if mapping:
         mapping_path = tenant_dir / "mapping.json"
-        mapping_path.write_text(mapping, encoding="utf-8")
+        await run_in_threadpool(mapping_path.write_text, mapping, encoding="utf-8")
     return {
         "dataset_path": str(dataset_path),
         "mapping_path": str(mapping_path) if mapping_path else None,
@@ -211,10 +272,7 @@ async def upload_dataset(
 
 @app.post("/train")
 def train(request: TrainRequest) -> dict:
-    job_id = str(uuid.uuid4())
     args = [
-        sys.executable,
-        str(ROOT / "src" / "train_pipeline.py"),
         "--tenant-id",
         request.tenant_id,
         "--data-path",
@@ -226,8 +284,33 @@ def train(request: TrainRequest) -> dict:
         args += ["--queue-id", request.queue_id]
     if request.notify_email:
         args += ["--notify-email", request.notify_email]
-    subprocess.Popen(args, cwd=str(ROOT))
-    return {"status": "started", "job_id": job_id}
+    threads = os.getenv("TRAIN_THREADS_PER_JOB")
+    if threads:
+        args += ["--threads", threads]
+    try:
+        job = _training_pool().submit(request.tenant_id, args, queue_id=request.queue_id)
+    except PoolFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "60"})
+    return {"status": job.status, "job_id": job.job_id}
+
+
+def _training_job(job_id: str, tenant_id: Optional[str]):
+    if not tenant_id:
+        raise HTTPException(status_code=400, detail="Missing tenant id")
+    job = _training_pool().get(job_id)
+    if job is None or job.tenant_id != tenant_id:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
+
+
+@app.get("/train/{job_id}")
+def train_status(job_id: str, x_tenant_id: Optional[str] = Header(None)) -> dict:
+    return _training_job(job_id, x_tenant_id).to_dict()
+
+
+@app.post("/train/{job_id}/cancel")
+def train_cancel(job_id: str, x_tenant_id: Optional[str] = Header(None)) -> dict:
+    return _training_pool().cancel(_training_job(job_id, x_tenant_id).job_id).to_dict()
 
 
 @app.get("/metrics")
@@ -310,7 +393,7 @@ def model_dataset(model_id: str, x_tenant_id: Optional[str] = Header(None)) -> d
         if client is None:
             raise HTTPException(status_code=500, detail="B2 client not configured")
         temp_path = ROOT / "artifacts_cache" / x_tenant_id / "datasets" / Path(key).name
-        download_file(client, bucket, key, temp_path)
+        download_dataset(client, bucket, key, temp_path)
         path = temp_path
     else:
         path = Path(dataset_path)
@@ -323,7 +406,7 @@ def model_dataset(model_id: str, x_tenant_id: Optional[str] = Header(None)) -> d
                     status_code=404,
                     detail=f"Dataset file not found: {path}",
                 )
-    df = pd.read_csv(path)
+    df = load_raw_transactions(str(path))
     return {"path": str(path), "columns": list(df.columns), "rows": df.to_dict(orient="records")}
 
 
@@ -333,8 +416,7 @@ def customer_exists(model_id: str, customer_id: int, x_tenant_id: Optional[str]
         raise HTTPException(status_code=400, detail="Missing tenant id")
     bundle = _load_artifacts_for_model(x_tenant_id, model_id)
     store = bundle["feature_store"]
-    exists = not store[store["CustomerID"] == customer_id].empty
-    return {"exists": bool(exists)}
+    return {"exists": customer_id in store}
 
 
 @app.get("/models/default")
@@ -526,7 +608,7 @@ def predict(request: PredictRequest, x_tenant_id: Optional[str] = Header(None))
         features = pd.DataFrame([request.features.dict()])
         customer_id = request.customer_id
     else:
-        row = store[store["CustomerID"] == request.customer_id]
+        row = store.lookup(request.customer_id)
         if row.empty:
             raise HTTPException(status_code=404, detail="Customer not found")
         features = row[FEATURE_COLS]
@@ -570,21 +652,41 @@ def _load_artifacts_for_model(tenant_id: str, model_id: str) -> dict:
             "churn_best.joblib",
             "ltv_xgb.joblib",
             "segment_summary.csv",
-            "feature_store.csv",
         ]
+        # A model's artifacts never change once uploaded, so files already
+        # downloaded (boto3 writes them via a temporary file) are reused.
         for name in files:
-            download_file(client, bucket, f"{prefix}/{name}", cache_dir / name)
+            if not (cache_dir / name).exists():
+                download_file(client, bucket, f"{prefix}/{name}", cache_dir / name)
+        if feature_store_path(cache_dir) is None:
+            try:
+                download_file(client, bucket, f"{prefix}/{FEATURE_STORE_FILE}", cache_dir / FEATURE_STORE_FILE)
+            except Exception:
+                # Models trained before the columnar feature store only have the CSV.
+                download_file(client, bucket, f"{prefix}/{FEATURE_STORE_CSV}", cache_dir / FEATURE_STORE_CSV)
         base = cache_dir
     else:
         base = Path(artifact_prefix)
 
+    path = feature_store_path(base)
+    if path is None:
+        raise HTTPException(status_code=500, detail="Feature store missing")
+    # Keyed on mtime so a re-downloaded or rewritten store is picked up.
+    return _open_artifacts(tenant_id, model_id, str(base), path.stat().st_mtime)
+
+
+# Opened artifacts of recently used models. Reading the feature store is linear
+# in its size, so it is done once per model rather than on every request.
+@lru_cache(maxsize=int(os.getenv("MODEL_CACHE_SIZE", "8")))
+def _open_artifacts(tenant_id: str, model_id: str, base: str, store_mtime: float) -> dict:
+    base_path = Path(base)
     return {
-        "scaler": joblib.load(base / "scaler.joblib"),
-        "kmeans": joblib.load(base / "kmeans.joblib"),
-        "churn_model": _load_churn_model(base / "churn_best.joblib"),
-        "ltv_model": joblib.load(base / "ltv_xgb.joblib"),
-        "segment_summary": pd.read_csv(base / "segment_summary.csv"),
-        "feature_store": pd.read_csv(base / "feature_store.csv"),
+        "scaler": joblib.load(base_path / "scaler.joblib"),
+        "kmeans": joblib.load(base_path / "kmeans.joblib"),
+        "churn_model": _load_churn_model(base_path / "churn_best.joblib"),
+        "ltv_model": joblib.load(base_path / "ltv_xgb.joblib"),
+        "segment_summary": pd.read_csv(base_path / "segment_summary.csv"),
+        "feature_store": FeatureStore.open(feature_store_path(base_path)),
     }
 
 
@@ -632,7 +734,7 @@ def predict_job(request: PredictJobRequest) -> dict:
                 features = pd.DataFrame([request.features.dict()])
                 customer_id = request.customer_id
             else:
-                row = store[store["CustomerID"] == request.customer_id]
+                row = store.lookup(request.customer_id)
                 if row.empty:
                     raise HTTPException(status_code=404, detail="Customer not found")
                 features = row[FEATURE_COLS]
@@ -697,13 +799,13 @@ def predict_job(request: PredictJobRequest) -> dict:
             return {"status": "completed", "prediction_id": prediction_id}
 
         if request.mode == "batch":
-            features = store[FEATURE_COLS]
-            segment_features = store[SEGMENT_COLS].astype("float64", copy=False)
+            features = store.frame[FEATURE_COLS]
+            segment_features = store.frame[SEGMENT_COLS].astype("float64", copy=False)
             scaled_features = _scale_segment_features(scaler, kmeans, segment_features)
             segments = kmeans.predict(scaled_features)
             churn_probs = churn_model.predict_proba(features)[:, 1]
             ltv_preds = ltv_model.predict(features)
-            results = store[["CustomerID"]].copy()
+            results = store.frame[["CustomerID"]].copy()
             results["segment"] = segments
             results["churn_probability"] = churn_probs
             results["ltv_estimate"] = ltv_preds
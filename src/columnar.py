@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.ipc as ipc
+except ImportError:  # pragma: no cover
+    pa = None
+    feather = None
+    ipc = None
+
+COLUMNAR_SUFFIX = ".arrow"
+EXCEL_SUFFIXES = {".xlsx", ".xls"}
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("pyarrow is required for columnar files")
+
+
+def content_hash(path: Path, extra: Optional[Dict] = None) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    if extra:
+        digest.update(json.dumps(extra, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _arrow_compatible(df: pd.DataFrame) -> pd.DataFrame:
+    # Spreadsheet exports often mix ints and strings in id columns (e.g. "C536379").
+    mixed = [
+        col
+        for col in df.columns
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed")
+    ]
+    if not mixed:
+        return df
+    df = df.copy()
+    for col in mixed:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def write_columnar(df: pd.DataFrame, path: Path) -> Path:
+    _require_pyarrow()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(_arrow_compatible(df), preserve_index=False)
+    # Uncompressed Arrow IPC so readers can memory-map the file directly.
+    tmp_path = path.with_name(path.name + ".tmp")
+    feather.write_feather(table, str(tmp_path), compression="uncompressed")
+    tmp_path.replace(path)
+    return path
+
+
+# Schema metadata listing columns written as plain values that read back as
+# categoricals (see write_columnar_chunks).
+_CATEGORICAL_COLUMNS_KEY = b"categorical_columns"
+
+
+# Converts DataFrame chunks to Arrow tables sharing the schema of the first
+# chunk. Categorical columns become dictionaries with 32-bit indices (chunks
+# differ in their number of categories) or, with decode_categoricals, plain
+# values.
+class _ChunkEncoder:
+    def __init__(self, decode_categoricals: bool = False) -> None:
+        self.decode_categoricals = decode_categoricals
+        self.schema = None
+
+    def encode(self, df: pd.DataFrame) -> pa.Table:
+        table = pa.Table.from_pandas(_arrow_compatible(df), preserve_index=False)
+        if self.schema is None:
+            schema = table.schema
+            categorical = []
+            for i, field in enumerate(schema):
+                if pa.types.is_dictionary(field.type):
+                    categorical.append(field.name)
+                    value_type = field.type.value_type
+                    dtype = value_type if self.decode_categoricals else pa.dictionary(pa.int32(), value_type)
+                    schema = schema.set(i, field.with_type(dtype))
+            if self.decode_categoricals:
+                metadata = dict(schema.metadata or {})
+                metadata[_CATEGORICAL_COLUMNS_KEY] = json.dumps(categorical).encode("utf-8")
+                schema = schema.with_metadata(metadata)
+            self.schema = schema
+        return pa.Table.from_arrays(
+            [table.column(field.name).cast(field.type) for field in self.schema], schema=self.schema
+        )
+
+
+def write_columnar_chunks(chunks: Iterable[pd.DataFrame], path: Path) -> int:
+    # Streams chunks into one Arrow IPC file with only one chunk in memory at a
+    # time. An IPC file holds a single dictionary per column, which chunks with
+    # their own categories cannot share, so categoricals are stored as values
+    # and encoded again by read_columnar. Returns the number of rows written;
+    # no file is created without rows.
+    _require_pyarrow()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    encoder = _ChunkEncoder(decode_categoricals=True)
+    writer = None
+    rows = 0
+    try:
+        for df in chunks:
+            table = encoder.encode(df)
+            if writer is None:
+                writer = ipc.new_file(str(tmp_path), encoder.schema)
+            writer.write_table(table)
+            rows += len(df)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    if writer is None:
+        return 0
+    writer.close()
+    tmp_path.replace(path)
+    return rows
+
+
+def concat_columnar_chunks(chunks: Iterable[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    # Like pd.concat, but chunks are held as Arrow tables and converted column
+    # by column, releasing the Arrow memory as it goes, so the peak is about one
+    # copy of the result. Chunk dictionaries are unified in the conversion.
+    _require_pyarrow()
+    encoder = _ChunkEncoder()
+    tables = [encoder.encode(df) for df in chunks]
+    if not tables:
+        return None
+    table = pa.concat_tables(tables)
+    del tables
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Rows filtered out of a chunk leave unused categories behind.
+            df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+
+def read_columnar(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    _require_pyarrow()
+    table = feather.read_table(str(path), columns=columns, memory_map=True)
+    categorical = json.loads((table.schema.metadata or {}).get(_CATEGORICAL_COLUMNS_KEY, b"[]"))
+    return table.to_pandas(categories=[col for col in categorical if col in table.column_names])
+
+
+def columnar_sibling(path: str) -> str:
+    # Works for local paths and B2 object keys alike.
+    stem, dot, suffix = path.rpartition(".")
+    return f"{stem}{COLUMNAR_SUFFIX}" if dot and "/" not in suffix else f"{path}{COLUMNAR_SUFFIX}"
+
+
+def convert_excel_to_columnar(path: Path) -> Path:
+    sheets = pd.read_excel(path, sheet_name=None)
+    frames = [frame for frame in sheets.values() if not frame.empty]
+    if not frames:
+        raise ValueError(f"No data found in workbook: {path.name}")
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return write_columnar(df, Path(columnar_sibling(str(path))))
+
+
+def excel_as_columnar(path: Path) -> Optional[Path]:
+    if pa is None:
+        return None
+    target = Path(columnar_sibling(str(path)))
+    if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+        return target
+    return convert_excel_to_columnar(path)
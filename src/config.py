@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
 
 @dataclass(frozen=True)
@@ -19,7 +20,56 @@ class Config:
     random_state: int = 42
     min_transactions: int = 2
     k_range: tuple = (3, 8)
+    # k selection: "silhouette", "calinski_harabasz" or "elbow" (inertia knee).
+    k_criterion: str = "silhouette"
+    # Customers scored for the silhouette; larger inputs use a stratified sample.
+    k_sample_size: int = 10_000
+    # From this many customers KMeans fits use MiniBatchKMeans.
+    kmeans_minibatch_threshold: int = 100_000
+    # k values fitted concurrently; None uses one per budget thread (up to the number of k).
+    k_workers: Optional[int] = None
+    # Churn decision threshold chosen on validation by "accuracy", "f1" or "cost".
+    threshold_objective: str = "accuracy"
+    # Business cost of a false positive / false negative churn prediction.
+    cost_fp: float = 5.0
+    cost_fn: float = 20.0
+    # CPU threads per training job (BLAS/OpenMP, DuckDB, model fits); None uses
+    # every available core. Overridden by --threads.
+    n_threads: Optional[int] = None
+    # Upper bound on trees per XGBoost model; early stopping usually ends sooner.
+    xgb_max_estimators: int = 600
+    # Grid points drawn (with random_state) for the XGBoost search. Fixed so the
+    # searched models do not depend on n_threads, which only sets concurrency.
+    xgb_search_candidates: int = 4
+    # Continue from the tenant's previous models (also enabled by --incremental).
+    warm_start: bool = False
+    # Consecutive incremental runs before a full retrain is forced.
+    warm_start_max_runs: int = 5
+    # Allowed drop in churn AUC / relative rise in LTV RMSE versus the last full retrain.
+    warm_start_auc_tolerance: float = 0.02
+    warm_start_rmse_tolerance: float = 0.05
     mlflow_experiment: str = "customer_segmentation_retention"
+    # Rows per chunk for streaming ingestion; None loads the whole file at once.
+    ingest_chunksize: Optional[int] = None
+    # Reuse cleaned transactions cached by content hash of the dataset + mapping.
+    cache_cleaned: bool = True
+    # Reuse feature/model stage outputs cached by hash of their inputs, code and config.
+    cache_stages: bool = True
+    # Cached outputs kept per stage (most recently used first).
+    stage_cache_keep: int = 3
+    # Columns that identify a duplicate transaction; None compares every column.
+    dedup_keys: Optional[tuple] = None
+    # Historical cutoffs stacked into the churn/LTV training set (1 = latest only).
+    rolling_cutoffs: int = 1
+    # Days between consecutive rolling cutoffs.
+    rolling_step_days: int = 7
+    # Processes for feature building (capped by n_threads); >1 hash-partitions
+    # transactions by CustomerID.
+    feature_workers: int = 1
+    # Cleaned data at least this large is featurized out of core with DuckDB, if installed.
+    sql_backend_min_bytes: int = 2 * 1024**3
+    # DuckDB memory_limit (e.g. "8GB"); None keeps DuckDB's default of 80% of RAM.
+    sql_memory_limit: Optional[str] = None
 
 
 def get_paths() -> Paths:
@@ -1,29 +1,199 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
+from columnar import (
+    COLUMNAR_SUFFIX,
+    EXCEL_SUFFIXES,
+    concat_columnar_chunks,
+    content_hash,
+    excel_as_columnar,
+    read_columnar,
+    write_columnar,
+    write_columnar_chunks,
+)
+from profiling import PipelineProfiler, phase
 
-def load_raw_transactions(path: str) -> pd.DataFrame:
-    file_path = Path(path)
-    if file_path.suffix.lower() in {".xlsx", ".xls"}:
-        df = pd.read_excel(file_path)
-    else:
-        df = pd.read_csv(file_path, encoding="ISO-8859-1")
-    return df
+TRANSACTION_COLUMNS = [
+    "InvoiceNo",
+    "StockCode",
+    "Quantity",
+    "InvoiceDate",
+    "UnitPrice",
+    "CustomerID",
+    "TotalPrice",
+]
 
+DATETIME_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y",
+    "%d-%m-%Y %H:%M",
+    "%d.%m.%Y %H:%M",
+    "%Y/%m/%d %H:%M",
+]
 
-def standardize_columns(df: pd.DataFrame, mapping: Optional[Dict[str, str]] = None) -> pd.DataFrame:
-    if not mapping:
-        return df
+# Bump when the cleaning rules change so cached cleaned files are not reused.
+CLEAN_CACHE_VERSION = 3
+
+
+CANONICAL_COLUMNS = {
+    "customer_id": "CustomerID",
+    "order_id": "InvoiceNo",
+    "order_datetime": "InvoiceDate",
+    "product_id": "StockCode",
+    "quantity": "Quantity",
+    "unit_price": "UnitPrice",
+    "order_total": "UnitPrice",
+}
+
+COLUMN_DTYPES = {
+    "CustomerID": "Int64",
+    "InvoiceNo": "category",
+    "StockCode": "category",
+    "Quantity": "Int32",
+    "UnitPrice": "float32",
+}
+
+try:
+    import pyarrow  # noqa: F401
 
+    HAS_PYARROW = True
+except ImportError:  # pragma: no cover
+    HAS_PYARROW = False
+
+CSV_ENGINE = "pyarrow" if HAS_PYARROW else "c"
+
+
+def _validate_mapping(mapping: Dict[str, str]) -> None:
     required = {"customer_id", "order_id", "order_datetime", "product_id"}
     missing = required - set(mapping.keys())
     if missing:
         raise ValueError(f"Missing required mappings: {sorted(missing)}")
+    if not ({"quantity", "unit_price"} <= set(mapping.keys()) or "order_total" in mapping):
+        raise ValueError("Provide quantity+unit_price or order_total in mapping.")
+
+
+def _mapped_columns(mapping: Dict[str, str]) -> Dict[str, str]:
+    keys = ["customer_id", "order_id", "order_datetime", "product_id"]
+    if "quantity" in mapping and "unit_price" in mapping:
+        keys += ["quantity", "unit_price"]
+    else:
+        keys.append("order_total")
+    return {mapping[key]: CANONICAL_COLUMNS[key] for key in keys}
+
+
+def _read_csv_kwargs(mapping: Optional[Dict[str, str]], engine: str = "c") -> Dict:
+    kwargs: Dict = {"encoding": "ISO-8859-1", "engine": engine}
+    if mapping:
+        _validate_mapping(mapping)
+        columns = _mapped_columns(mapping)
+        dtypes = {source: COLUMN_DTYPES[target] for source, target in columns.items() if target in COLUMN_DTYPES}
+        if engine == "pyarrow":
+            # pyarrow infers category values (dropping leading zeros from numeric
+            # looking codes); read them as strings and encode afterwards.
+            dtypes = {col: "str" if dtype == "category" else dtype for col, dtype in dtypes.items()}
+        kwargs["usecols"] = list(columns)
+        kwargs["dtype"] = dtypes
+    return kwargs
 
+
+def _loose_dtypes(kwargs: Dict) -> Dict:
+    # Exports with fractional quantities or non-numeric ids cannot be parsed with
+    # the compact numeric dtypes; keep the categoricals and convert afterwards.
+    loose = dict(kwargs)
+    loose["dtype"] = {col: dtype for col, dtype in kwargs["dtype"].items() if dtype in {"category", "str"}}
+    return loose
+
+
+def _compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    for col in ("InvoiceNo", "StockCode"):
+        # Ids are categoricals over strings whichever reader produced them, so
+        # row hashes agree between full, chunked and Excel loads.
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype) and pd.api.types.is_string_dtype(dtype.categories):
+            continue
+        values = df[col].astype(object)
+        df[col] = values.where(values.isna(), values.astype(str)).astype("category")
+    for col in ("CustomerID", "Quantity", "UnitPrice"):
+        if df[col].dtype == COLUMN_DTYPES[col]:
+            continue
+        numeric = pd.to_numeric(df[col], errors="coerce")
+        try:
+            df[col] = numeric.astype(COLUMN_DTYPES[col])
+        except (TypeError, ValueError):
+            df[col] = numeric
+    return df
+
+
+def _project_mapped(df: pd.DataFrame, mapping: Optional[Dict[str, str]]) -> pd.DataFrame:
+    if not mapping:
+        return df
+    df = df.rename(columns=_mapped_columns(mapping))
+    if "Quantity" not in df.columns:
+        df["Quantity"] = pd.Series(1, index=df.index, dtype=COLUMN_DTYPES["Quantity"])
+    return _compact_dtypes(df)
+
+
+def load_raw_transactions(path: str, mapping: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    file_path = Path(path)
+    if file_path.suffix.lower() in EXCEL_SUFFIXES:
+        columns = None
+        if mapping:
+            _validate_mapping(mapping)
+            columns = list(_mapped_columns(mapping))
+        columnar_path = excel_as_columnar(file_path)
+        if columnar_path is not None:
+            df = read_columnar(columnar_path, columns=columns)
+        else:
+            df = pd.read_excel(file_path, usecols=columns)
+    else:
+        kwargs = _read_csv_kwargs(mapping, CSV_ENGINE)
+        try:
+            df = pd.read_csv(file_path, **kwargs)
+        except (ValueError, TypeError):
+            if not mapping:
+                raise
+            df = pd.read_csv(file_path, **_loose_dtypes(kwargs))
+    return _project_mapped(df, mapping)
+
+
+def iter_raw_transactions(
+    path: str, chunksize: int, mapping: Optional[Dict[str, str]] = None
+) -> Iterator[pd.DataFrame]:
+    file_path = Path(path)
+    if file_path.suffix.lower() in EXCEL_SUFFIXES:
+        # Workbooks cannot be read incrementally; slice the loaded frame instead.
+        df = load_raw_transactions(path, mapping)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start : start + chunksize]
+        return
+    kwargs = _read_csv_kwargs(mapping)
+    if mapping:
+        # A later chunk may not fit the compact dtypes, so chunks are parsed
+        # loosely and narrowed one at a time.
+        kwargs = _loose_dtypes(kwargs)
+    with pd.read_csv(file_path, chunksize=chunksize, **kwargs) as reader:
+        for chunk in reader:
+            yield _project_mapped(chunk, mapping)
+
+
+def standardize_columns(df: pd.DataFrame, mapping: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    if not mapping:
+        return df
+
+    _validate_mapping(mapping)
     df = df.copy()
 
     def _col(key: str) -> str:
@@ -37,33 +207,282 @@ def standardize_columns(df: pd.DataFrame, mapping: Optional[Dict[str, str]] = No
     if "quantity" in mapping and "unit_price" in mapping:
         df["Quantity"] = df[_col("quantity")]
         df["UnitPrice"] = df[_col("unit_price")]
-    elif "order_total" in mapping:
+    else:
         df["Quantity"] = 1
         df["UnitPrice"] = df[_col("order_total")]
-    else:
-        raise ValueError("Provide quantity+unit_price or order_total in mapping.")
 
     return df
 
 
-def clean_transactions(df: pd.DataFrame) -> pd.DataFrame:
+def detect_datetime_format(values: pd.Series, sample_size: int = 1000) -> Optional[str]:
+    sample = values.dropna()
+    if sample.empty:
+        return None
+    if len(sample) > sample_size:
+        sample = sample.sample(sample_size, random_state=0)
+    sample = sample.astype(str)
+    best_format = None
+    best_hits = 0
+    for fmt in DATETIME_FORMATS:
+        hits = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        if hits > best_hits:
+            best_format = fmt
+            best_hits = hits
+        if hits == len(sample):
+            break
+    return best_format
+
+
+def _format_matches(values: pd.Series, datetime_format: str, sample_size: int = 200) -> bool:
+    # A remembered format can go stale when a tenant changes export settings.
+    sample = values.dropna().head(sample_size).astype(str)
+    if sample.empty:
+        return True
+    hits = pd.to_datetime(sample, format=datetime_format, errors="coerce").notna().sum()
+    return hits * 2 >= len(sample)
+
+
+def parse_datetimes(
+    values: pd.Series, datetime_format: Optional[str] = None
+) -> Tuple[pd.Series, Optional[str], int]:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, None, 0
+    if datetime_format is None or not _format_matches(values, datetime_format):
+        datetime_format = detect_datetime_format(values)
+    if datetime_format is None:
+        return pd.to_datetime(values, errors="coerce", format="mixed"), None, int(values.notna().sum())
+
+    parsed = pd.to_datetime(values, format=datetime_format, errors="coerce")
+    missed = parsed.isna() & values.notna()
+    fallback_rows = int(missed.sum())
+    if fallback_rows:
+        # Only rows that do not match the detected format take the slow per-element path.
+        parsed[missed] = pd.to_datetime(values[missed].astype(str), errors="coerce", format="mixed")
+    return parsed, datetime_format, fallback_rows
+
+
+def row_fingerprints(df: pd.DataFrame, subset: Optional[Sequence[str]] = None) -> np.ndarray:
+    columns = list(subset) if subset else list(df.columns)
+    fingerprints = np.zeros(len(df), dtype=np.uint64)
+    # Hash one column at a time and fold it in, so only two uint64 arrays are live.
+    for col in columns:
+        values = df[col]
+        # Normalise representations that differ between readers but not in value.
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = values.astype("datetime64[ns]")
+        elif pd.api.types.is_float_dtype(values):
+            values = values.astype("float64")
+        fingerprints *= np.uint64(0x100000001B3)
+        fingerprints ^= pd.util.hash_pandas_object(values, index=False).to_numpy()
+    return fingerprints
+
+
+# Sorted uint64 fingerprints of rows already kept, 8 bytes per row.
+class RowHashSet:
+    def __init__(self, hashes: Optional[np.ndarray] = None) -> None:
+        if hashes is None:
+            hashes = np.empty(0, dtype=np.uint64)
+        self.hashes = np.sort(np.asarray(hashes, dtype=np.uint64))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        if not len(self.hashes):
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.searchsorted(self.hashes, hashes)
+        pos[pos == len(self.hashes)] = 0
+        return self.hashes[pos] == hashes
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        # Keep the first occurrence within the batch, like drop_duplicates(keep="first").
+        keep = ~pd.Series(hashes).duplicated().to_numpy()
+        # Probe the set in sorted order, which keeps the binary searches cache
+        # friendly, and insert the new values at the positions found instead of
+        # re-sorting the whole set.
+        candidates = np.flatnonzero(keep)
+        candidates = candidates[np.argsort(hashes[candidates])]
+        values = hashes[candidates]
+        pos = np.searchsorted(self.hashes, values)
+        found = np.zeros(len(values), dtype=bool)
+        inside = pos < len(self.hashes)
+        found[inside] = self.hashes[pos[inside]] == values[inside]
+        keep[candidates[found]] = False
+        self.hashes = np.insert(self.hashes, pos[~found], values[~found])
+        return keep
+
+
+def drop_duplicate_rows(
+    df: pd.DataFrame,
+    subset: Optional[Sequence[str]] = None,
+    seen: Optional[RowHashSet] = None,
+) -> pd.DataFrame:
+    seen = RowHashSet() if seen is None else seen
+    keep = seen.add_new(row_fingerprints(df, subset))
+    return df[keep]
+
+
+def _is_cancelled(invoice: pd.Series) -> pd.Series:
+    if isinstance(invoice.dtype, pd.CategoricalDtype):
+        # Test each distinct invoice number once instead of every row.
+        flags = np.asarray(invoice.cat.categories.astype(str).str.startswith("C"), dtype=bool)
+        codes = invoice.cat.codes.to_numpy()
+        return pd.Series(flags[codes] & (codes >= 0), index=invoice.index)
+    return invoice.astype(str).str.startswith("C")
+
+
+def clean_transactions(
+    df: pd.DataFrame,
+    datetime_format: Optional[str] = None,
+    stats: Optional[Dict] = None,
+    dedup_keys: Optional[Sequence[str]] = None,
+    seen: Optional[RowHashSet] = None,
+) -> pd.DataFrame:
     df = df.copy()
 
-    df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"], errors="coerce")
+    df["InvoiceDate"], datetime_format, fallback_rows = parse_datetimes(df["InvoiceDate"], datetime_format)
+    if stats is not None:
+        stats["datetime_format"] = datetime_format
+        stats["datetime_fallback_rows"] = stats.get("datetime_fallback_rows", 0) + fallback_rows
     df["CustomerID"] = pd.to_numeric(df["CustomerID"], errors="coerce").astype("Int64")
 
     # Drop rows with missing critical fields
     df = df.dropna(subset=["InvoiceNo", "InvoiceDate", "CustomerID", "StockCode"])
 
     # Remove canceled invoices
-    df = df[~df["InvoiceNo"].astype(str).str.startswith("C")]
+    df = df[~_is_cancelled(df["InvoiceNo"])]
 
     # Remove non-positive quantities/prices
     df = df[(df["Quantity"] > 0) & (df["UnitPrice"] > 0)]
 
     # Remove duplicates
-    df = df.drop_duplicates()
+    df = drop_duplicate_rows(df, dedup_keys, seen)
+
+    if isinstance(df["Quantity"].dtype, pd.Int32Dtype):
+        df["Quantity"] = df["Quantity"].astype("int32")
+    df["TotalPrice"] = df["Quantity"].astype("float64") * df["UnitPrice"].astype("float64")
+
+    return df
+
+
+def iter_clean_transactions(
+    path: str,
+    mapping: Optional[Dict[str, str]] = None,
+    chunksize: int = 100_000,
+    datetime_format: Optional[str] = None,
+    stats: Optional[Dict] = None,
+    dedup_keys: Optional[Sequence[str]] = None,
+    seen: Optional[RowHashSet] = None,
+) -> Iterator[pd.DataFrame]:
+    stats = {} if stats is None else stats
+    # The seen-set outlives each chunk so duplicates are dropped across chunks too.
+    seen = RowHashSet() if seen is None else seen
+    # Each chunk goes through the same rules as clean_transactions and is then
+    # projected onto the canonical columns, so only cleaned rows outlive a chunk.
+    for chunk in iter_raw_transactions(path, chunksize, mapping):
+        cleaned = clean_transactions(chunk, datetime_format, stats, dedup_keys, seen)
+        # Detect the date format on the first chunk only and reuse it afterwards.
+        datetime_format = stats.get("datetime_format") or datetime_format
+        if cleaned.empty:
+            continue
+        yield cleaned[TRANSACTION_COLUMNS]
+
+
+def collect_clean_transactions(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    if HAS_PYARROW:
+        # Chunks are kept as Arrow tables sharing one dictionary per categorical
+        # column, rather than as DataFrames concatenated and re-categorized.
+        df = concat_columnar_chunks(chunks)
+        return pd.DataFrame(columns=TRANSACTION_COLUMNS) if df is None else df
+    frames = list(chunks)
+    if not frames:
+        return pd.DataFrame(columns=TRANSACTION_COLUMNS)
+    categorical = [col for col in TRANSACTION_COLUMNS if isinstance(frames[0][col].dtype, pd.CategoricalDtype)]
+    df = pd.concat(frames, ignore_index=True)
+    for col in categorical:
+        # Chunks carry different categories, which concat widens to object.
+        df[col] = df[col].astype("category")
+    return df
 
-    df["TotalPrice"] = df["Quantity"] * df["UnitPrice"]
 
+def clean_cache_path(
+    path: str,
+    cache_dir: Path,
+    mapping: Optional[Dict[str, str]] = None,
+    dedup_keys: Optional[Sequence[str]] = None,
+) -> Path:
+    extra = {"mapping": mapping, "dedup_keys": dedup_keys, "version": CLEAN_CACHE_VERSION}
+    return Path(cache_dir) / f"{content_hash(Path(path), extra)}{COLUMNAR_SUFFIX}"
+
+
+def write_clean_cache(
+    path: str,
+    cache_path: Path,
+    mapping: Optional[Dict[str, str]] = None,
+    chunksize: Optional[int] = None,
+    datetime_format: Optional[str] = None,
+    stats: Optional[Dict] = None,
+    dedup_keys: Optional[Sequence[str]] = None,
+) -> int:
+    # Cleans the file chunk by chunk straight into the columnar cache, so memory
+    # stays bounded by the chunk size whatever the size of the dataset.
+    chunks = iter_clean_transactions(path, mapping, chunksize or 100_000, datetime_format, stats, dedup_keys)
+    rows = write_columnar_chunks(chunks, cache_path)
+    if not rows:
+        write_columnar(pd.DataFrame(columns=TRANSACTION_COLUMNS), cache_path)
+    return rows
+
+
+def load_clean_transactions(
+    path: str,
+    mapping: Optional[Dict[str, str]] = None,
+    cache_dir: Optional[Path] = None,
+    chunksize: Optional[int] = None,
+    datetime_format: Optional[str] = None,
+    stats: Optional[Dict] = None,
+    dedup_keys: Optional[Sequence[str]] = None,
+    profiler: Optional[PipelineProfiler] = None,
+) -> pd.DataFrame:
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = clean_cache_path(path, cache_dir, mapping, dedup_keys)
+        if cache_path.exists():
+            with phase(profiler, "load_cached") as record:
+                df = read_columnar(cache_path)
+                record["rows"] = len(df)
+            return df
+
+    if chunksize and cache_path is not None:
+        # Chunks are read, standardized, cleaned and written to the cache in one
+        # pass; the result is then memory-mapped from the cache.
+        with phase(profiler, "load_clean") as record:
+            record["rows"] = write_clean_cache(
+                path, cache_path, mapping, chunksize, datetime_format, stats, dedup_keys
+            )
+        with phase(profiler, "load_cached") as record:
+            df = read_columnar(cache_path)
+            record["rows"] = len(df)
+        return df
+
+    if chunksize:
+        # Chunks are read, standardized and cleaned in one pass.
+        with phase(profiler, "load_clean") as record:
+            df = collect_clean_transactions(
+                iter_clean_transactions(path, mapping, chunksize, datetime_format, stats, dedup_keys)
+            )
+            record["rows"] = len(df)
+    else:
+        # Mapped columns are standardized while the file is read.
+        with phase(profiler, "load") as record:
+            raw = load_raw_transactions(path, mapping)
+            record["rows"] = len(raw)
+        with phase(profiler, "clean") as record:
+            df = clean_transactions(raw, datetime_format, stats, dedup_keys)
+            record["rows"] = len(df)
+        del raw
+
+    if cache_path is not None:
+        with phase(profiler, "write_clean_cache", rows=len(df)):
+            df = df[TRANSACTION_COLUMNS].reset_index(drop=True)
+            write_columnar(df, cache_path)
     return df
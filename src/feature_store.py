@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from columnar import COLUMNAR_SUFFIX, pa, read_columnar, write_columnar
+
+FEATURE_STORE_NAME = "feature_store"
+FEATURE_STORE_FILE = f"{FEATURE_STORE_NAME}{COLUMNAR_SUFFIX}"
+# Written by models trained before the columnar store existed.
+FEATURE_STORE_CSV = f"{FEATURE_STORE_NAME}.csv"
+
+
+def write_feature_store(features: pd.DataFrame, directory: Path) -> Path:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    features = features.sort_values("CustomerID", kind="stable", ignore_index=True)
+    if pa is None:
+        path = directory / FEATURE_STORE_CSV
+        features.to_csv(path, index=False)
+        return path
+    path = directory / FEATURE_STORE_FILE
+    write_columnar(features, path)
+    return path
+
+
+def feature_store_path(directory: Path) -> Optional[Path]:
+    for name in (FEATURE_STORE_FILE, FEATURE_STORE_CSV):
+        path = Path(directory) / name
+        if path.exists():
+            return path
+    return None
+
+
+# Per-customer features sorted by CustomerID. The sorted id array is the index:
+# lookups are a binary search instead of a scan of the whole table.
+class FeatureStore:
+    def __init__(self, features: pd.DataFrame) -> None:
+        features = features[features["CustomerID"].notna()]
+        ids = features["CustomerID"].to_numpy(dtype=np.int64)
+        if len(ids) > 1 and not (ids[1:] >= ids[:-1]).all():
+            order = np.argsort(ids, kind="stable")
+            features = features.iloc[order]
+            ids = ids[order]
+        self.frame = features.reset_index(drop=True)
+        self.ids = ids
+
+    @classmethod
+    def open(cls, path: Path) -> "FeatureStore":
+        path = Path(path)
+        if path.suffix == COLUMNAR_SUFFIX:
+            return cls(read_columnar(path))
+        return cls(pd.read_csv(path))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, customer_id: int) -> bool:
+        return len(self.positions([customer_id])) > 0
+
+    def positions(self, customer_ids: Iterable[int]) -> np.ndarray:
+        # Row positions of the requested customers that exist, in request order.
+        wanted = np.asarray(list(customer_ids), dtype=np.int64)
+        pos = np.searchsorted(self.ids, wanted)
+        found = pos < len(self.ids)
+        found[found] = self.ids[pos[found]] == wanted[found]
+        return pos[found]
+
+    def lookup(self, customer_id: int) -> pd.DataFrame:
+        return self.lookup_many([customer_id])
+
+    def lookup_many(self, customer_ids: Iterable[int]) -> pd.DataFrame:
+        return self.frame.iloc[self.positions(customer_ids)]
@@ -1,13 +1,43 @@
 from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
 import pandas as pd
+from pandas.util import hash_pandas_object
+
+
+def partition_by_customer(df: pd.DataFrame, n_partitions: int) -> List[pd.DataFrame]:
+    # Every row of a customer lands in the same partition, and rows keep their
+    # relative order, so per-customer aggregates match the unpartitioned frame.
+    buckets = hash_pandas_object(df["CustomerID"], index=False).to_numpy() % np.uint64(n_partitions)
+    order = np.argsort(buckets, kind="stable")
+    bounds = np.searchsorted(buckets[order], np.arange(1, n_partitions, dtype=np.uint64))
+    return [df.iloc[rows] for rows in np.split(order, bounds) if len(rows)]
+
+
+def _map_partitions(func: Callable, df: pd.DataFrame, n_workers: int, **kwargs) -> list:
+    partitions = partition_by_customer(df, n_workers)
+    with ProcessPoolExecutor(max_workers=min(n_workers, len(partitions))) as executor:
+        return list(executor.map(partial(func, **kwargs), partitions))
+
+
+def _concat_by_customer(frames: Sequence[pd.DataFrame], keys: Sequence[str] = ("CustomerID",)) -> pd.DataFrame:
+    return pd.concat(frames, ignore_index=True).sort_values(list(keys), kind="stable", ignore_index=True)
 
 
-def build_rfm_features(df: pd.DataFrame, snapshot_date: pd.Timestamp) -> pd.DataFrame:
+def build_rfm_features(
+    df: pd.DataFrame, snapshot_date: pd.Timestamp, n_workers: int = 1
+) -> pd.DataFrame:
+    if n_workers > 1:
+        return _concat_by_customer(
+            _map_partitions(build_rfm_features, df, n_workers, snapshot_date=snapshot_date)
+        )
     rfm = (
         df.groupby("CustomerID")
         .agg(
-            recency_days=("InvoiceDate", lambda x: (snapshot_date - x.max()).days),
             frequency=("InvoiceNo", "nunique"),
             monetary=("TotalPrice", "sum"),
             first_purchase=("InvoiceDate", "min"),
@@ -19,50 +49,238 @@ def build_rfm_features(df: pd.DataFrame, snapshot_date: pd.Timestamp) -> pd.Data
         .reset_index()
     )
 
+    rfm.insert(1, "recency_days", (snapshot_date - rfm["last_purchase"]).dt.days)
     rfm["purchase_span_days"] = (rfm["last_purchase"] - rfm["first_purchase"]).dt.days
-    rfm["avg_interpurchase_days"] = rfm.apply(
-        lambda row: row["purchase_span_days"] / (row["frequency"] - 1)
-        if row["frequency"] > 1
-        else row["purchase_span_days"],
-        axis=1,
+    rfm["avg_interpurchase_days"] = compute_avg_interpurchase_days(
+        rfm["purchase_span_days"].to_numpy(), rfm["frequency"].to_numpy()
     )
 
     rfm = rfm.drop(columns=["first_purchase", "last_purchase"])
     return rfm
 
 
-def build_time_split_features(
+def compute_avg_interpurchase_days(span_days: np.ndarray, frequency: np.ndarray) -> np.ndarray:
+    # Single-order customers keep their (zero) span rather than dividing by zero.
+    return np.where(frequency > 1, span_days / np.maximum(frequency - 1, 1), span_days).astype(np.float64)
+
+
+# Transactions sorted once by InvoiceDate and reduced to integer arrays. History
+# up to any cutoff is then a prefix of the arrays and each label window is a
+# contiguous slice, so no history/future frames are materialized.
+class _Timeline:
+    def __init__(self, df: pd.DataFrame) -> None:
+        dates = df["InvoiceDate"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        # Stable, so same-day rows of a customer are summed in input order and a
+        # customer partition reproduces the full-frame floats exactly.
+        order = np.argsort(dates, kind="stable")
+        self.dates = dates[order]
+        del dates
+
+        customer_codes, self.customer_ids = pd.factorize(df["CustomerID"], sort=True)
+        self.n_customers = len(self.customer_ids)
+        self.customer = customer_codes[order].astype(np.int32)
+        del customer_codes
+        invoice_codes, invoices = pd.factorize(df["InvoiceNo"])
+        self.n_invoices = max(len(invoices), 1)
+        self.invoice = invoice_codes[order].astype(np.int32)
+        del invoice_codes
+        self.price = df["TotalPrice"].to_numpy(dtype=np.float64)[order]
+        self.quantity = df["Quantity"].to_numpy()[order]
+
+        # In date order the first row of a (customer, invoice) pair is where it
+        # starts counting towards every later prefix.
+        self.first_invoice = _first_occurrences(self.customer, self.invoice, self.n_invoices)
+        product_codes, products = pd.factorize(df["StockCode"])
+        self.first_product = _first_occurrences(
+            self.customer, product_codes[order].astype(np.int32), max(len(products), 1)
+        )
+
+    def invoice_pairs(self, window: slice) -> np.ndarray:
+        return self.customer[window].astype(np.int64) * self.n_invoices + self.invoice[window]
+
+    def position(self, date: pd.Timestamp) -> int:
+        # Number of rows dated on or before `date`.
+        return int(np.searchsorted(self.dates, pd.Timestamp(date).as_unit("ns").value, side="right"))
+
+
+def _first_occurrences(customer: np.ndarray, values: np.ndarray, n_values: int) -> np.ndarray:
+    pairs = customer.astype(np.int64) * n_values + values
+    return ~pd.Series(pairs).duplicated().to_numpy()
+
+
+class _PrefixAggregates:
+    def __init__(self, timeline: _Timeline) -> None:
+        size = timeline.n_customers
+        self.timeline = timeline
+        self.stop = 0
+        self.rows = np.zeros(size, dtype=np.int64)
+        self.monetary = np.zeros(size, dtype=np.float64)
+        self.quantity = np.zeros(size, dtype=np.float64)
+        self.frequency = np.zeros(size, dtype=np.int64)
+        self.unique_products = np.zeros(size, dtype=np.int64)
+        self.first_purchase = np.full(size, np.iinfo(np.int64).max, dtype=np.int64)
+        self.last_purchase = np.full(size, np.iinfo(np.int64).min, dtype=np.int64)
+
+    def advance(self, stop: int) -> None:
+        t = self.timeline
+        window = slice(self.stop, stop)
+        customer = t.customer[window]
+        size = t.n_customers
+        self.rows += np.bincount(customer, minlength=size)
+        self.monetary += np.bincount(customer, weights=t.price[window], minlength=size)
+        self.quantity += np.bincount(customer, weights=t.quantity[window], minlength=size)
+        self.frequency += np.bincount(customer[t.first_invoice[window]], minlength=size)
+        self.unique_products += np.bincount(customer[t.first_product[window]], minlength=size)
+        np.minimum.at(self.first_purchase, customer, t.dates[window])
+        np.maximum.at(self.last_purchase, customer, t.dates[window])
+        self.stop = stop
+
+    def to_rfm(self, snapshot_date: pd.Timestamp) -> Tuple[pd.DataFrame, np.ndarray]:
+        active = np.flatnonzero(self.rows)
+        rows = self.rows[active]
+        frequency = self.frequency[active]
+        first = self.first_purchase[active]
+        last = self.last_purchase[active]
+        day = np.int64(86_400 * 10**9)
+        span = (last - first) // day
+        rfm = pd.DataFrame(
+            {
+                "CustomerID": self.timeline.customer_ids[active],
+                "recency_days": (pd.Timestamp(snapshot_date).as_unit("ns").value - last) // day,
+                "frequency": frequency,
+                "monetary": self.monetary[active],
+                "unique_products": self.unique_products[active],
+                "avg_basket_value": self.monetary[active] / rows,
+                "avg_quantity": self.quantity[active] / rows,
+                "purchase_span_days": span,
+                "avg_interpurchase_days": compute_avg_interpurchase_days(span, frequency),
+            }
+        )
+        return rfm, active
+
+
+def _window_labels(
+    timeline: _Timeline, active: np.ndarray, start: int, churn_stop: int, ltv_stop: int
+) -> pd.DataFrame:
+    size = timeline.n_customers
+    churn = slice(start, churn_stop)
+    # Distinct invoices inside the window only, regardless of earlier occurrences.
+    first_in_window = ~pd.Series(timeline.invoice_pairs(churn)).duplicated().to_numpy()
+    future_orders = np.bincount(timeline.customer[churn][first_in_window], minlength=size)
+    ltv = slice(start, ltv_stop)
+    future_spend = np.bincount(timeline.customer[ltv], weights=timeline.price[ltv], minlength=size)
+    labels = pd.DataFrame(
+        {
+            "future_orders": future_orders[active].astype(np.float64),
+            "future_spend": future_spend[active],
+        }
+    )
+    labels["churn_label"] = (labels["future_orders"] == 0).astype(int)
+    return labels
+
+
+def build_feature_tables(
     df: pd.DataFrame,
+    snapshot_date: pd.Timestamp,
     cutoff_date: pd.Timestamp,
     churn_window_days: int,
     ltv_horizon_days: int,
-) -> pd.DataFrame:
-    history = df[df["InvoiceDate"] <= cutoff_date].copy()
-    future = df[df["InvoiceDate"] > cutoff_date].copy()
-
-    snapshot_date = cutoff_date + pd.Timedelta(days=1)
-    features = build_rfm_features(history, snapshot_date)
+    n_workers: int = 1,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    if n_workers > 1:
+        results = _map_partitions(
+            build_feature_tables,
+            df,
+            n_workers,
+            snapshot_date=snapshot_date,
+            cutoff_date=cutoff_date,
+            churn_window_days=churn_window_days,
+            ltv_horizon_days=ltv_horizon_days,
+        )
+        return (
+            _concat_by_customer([rfm for rfm, _ in results]),
+            _concat_by_customer([modeling for _, modeling in results]),
+        )
+    # One sorted pass yields the cutoff-history features with churn/LTV labels
+    # and, continuing to the end, the full-snapshot RFM table.
+    timeline = _Timeline(df)
+    aggregates = _PrefixAggregates(timeline)
+    modeling = _split_at(timeline, aggregates, cutoff_date, churn_window_days, ltv_horizon_days)
+    aggregates.advance(len(timeline.dates))
+    rfm, _ = aggregates.to_rfm(snapshot_date)
+    return rfm, modeling
 
-    future_window_end = cutoff_date + pd.Timedelta(days=churn_window_days)
-    ltv_window_end = cutoff_date + pd.Timedelta(days=ltv_horizon_days)
 
-    future_churn = (
-        future[future["InvoiceDate"] <= future_window_end]
-        .groupby("CustomerID")["InvoiceNo"]
-        .nunique()
-        .rename("future_orders")
+def _split_at(
+    timeline: _Timeline,
+    aggregates: _PrefixAggregates,
+    cutoff_date: pd.Timestamp,
+    churn_window_days: int,
+    ltv_horizon_days: int,
+) -> pd.DataFrame:
+    start = timeline.position(cutoff_date)
+    aggregates.advance(start)
+    features, active = aggregates.to_rfm(cutoff_date + pd.Timedelta(days=1))
+    labels = _window_labels(
+        timeline,
+        active,
+        start,
+        timeline.position(cutoff_date + pd.Timedelta(days=churn_window_days)),
+        timeline.position(cutoff_date + pd.Timedelta(days=ltv_horizon_days)),
     )
-    future_ltv = (
-        future[future["InvoiceDate"] <= ltv_window_end]
-        .groupby("CustomerID")["TotalPrice"]
-        .sum()
-        .rename("future_spend")
+    return pd.concat([features, labels], axis=1)
+
+
+def build_time_split_features(
+    df: pd.DataFrame,
+    cutoff_date: pd.Timestamp,
+    churn_window_days: int,
+    ltv_horizon_days: int,
+    n_workers: int = 1,
+) -> pd.DataFrame:
+    if n_workers > 1:
+        return _concat_by_customer(
+            _map_partitions(
+                build_time_split_features,
+                df,
+                n_workers,
+                cutoff_date=cutoff_date,
+                churn_window_days=churn_window_days,
+                ltv_horizon_days=ltv_horizon_days,
+            )
+        )
+    timeline = _Timeline(df)
+    return _split_at(
+        timeline, _PrefixAggregates(timeline), cutoff_date, churn_window_days, ltv_horizon_days
     )
 
-    features = features.merge(future_churn, on="CustomerID", how="left")
-    features = features.merge(future_ltv, on="CustomerID", how="left")
-    features["future_orders"] = features["future_orders"].fillna(0)
-    features["future_spend"] = features["future_spend"].fillna(0.0)
-    features["churn_label"] = (features["future_orders"] == 0).astype(int)
 
-    return features
+def build_rolling_time_split_features(
+    df: pd.DataFrame,
+    cutoff_dates: Sequence[pd.Timestamp],
+    churn_window_days: int,
+    ltv_horizon_days: int,
+    n_workers: int = 1,
+) -> pd.DataFrame:
+    if n_workers > 1:
+        return _concat_by_customer(
+            _map_partitions(
+                build_rolling_time_split_features,
+                df,
+                n_workers,
+                cutoff_dates=cutoff_dates,
+                churn_window_days=churn_window_days,
+                ltv_horizon_days=ltv_horizon_days,
+            ),
+            keys=("cutoff_date", "CustomerID"),
+        )
+    # Cutoffs are visited in order so each one only adds the rows since the
+    # previous cutoff to the running per-customer aggregates.
+    timeline = _Timeline(df)
+    aggregates = _PrefixAggregates(timeline)
+    frames = []
+    for cutoff_date in sorted(pd.Timestamp(c) for c in cutoff_dates):
+        features = _split_at(timeline, aggregates, cutoff_date, churn_window_days, ltv_horizon_days)
+        features.insert(0, "cutoff_date", cutoff_date)
+        frames.append(features)
+    return pd.concat(frames, ignore_index=True)
@@ -5,19 +5,21 @@ from pathlib import Path
 import urllib.request
 from urllib.parse import urlparse
 
-from dotenv import load_dotenv
 from typing import Any, Dict, Optional
 
-import firebase_admin
-from firebase_admin import credentials, firestore
 from storage import get_b2_client, download_file, parse_b2_url
 
 
 _APP = None
 
-# Load .env from repo root if present (avoids re-setting env vars)
 ROOT = Path(__file__).resolve().parents[1]
-load_dotenv(ROOT / ".env", override=False)
+
+
+def _firestore():
+    # firebase_admin takes a while to import; deferred until Firestore is used.
+    from firebase_admin import firestore
+
+    return firestore
 
 
 def _download_service_account_from_url(url: str, dest: Path) -> Optional[Path]:
@@ -58,13 +60,20 @@ def _resolve_service_account_path(raw_path: str) -> Optional[Path]:
 def get_firestore():
     global _APP
     if _APP is None:
+        from dotenv import load_dotenv
+
+        # Load .env from repo root if present (avoids re-setting env vars)
+        load_dotenv(ROOT / ".env", override=False)
         raw_path = os.getenv("FIREBASE_SERVICE_ACCOUNT_PATH")
         service_account_path = _resolve_service_account_path(raw_path)
         if not service_account_path:
             return None
+        import firebase_admin
+        from firebase_admin import credentials
+
         cred = credentials.Certificate(str(service_account_path))
         _APP = firebase_admin.initialize_app(cred)
-    return firestore.client()
+    return _firestore().client()
 
 
 def write_training_metadata(
@@ -84,7 +93,7 @@ def write_training_metadata(
         "artifact_prefix": artifact_prefix,
         "dataset_path": dataset_path,
         "mapping_path": mapping_path,
-        "created_at": firestore.SERVER_TIMESTAMP,
+        "created_at": _firestore().SERVER_TIMESTAMP,
     }
     db.collection("tenants").document(tenant_id).collection("training_runs").document(run_id).set(data)
     db.collection("tenants").document(tenant_id).set({"latest_run": run_id}, merge=True)
@@ -105,7 +114,7 @@ def write_model_registry(
         "name": name,
         "metrics": metrics,
         "artifact_prefix": artifact_prefix,
-        "created_at": firestore.SERVER_TIMESTAMP,
+        "created_at": _firestore().SERVER_TIMESTAMP,
     }
     db.collection("tenants").document(tenant_id).collection("models").document(model_id).set(data)
 
@@ -115,7 +124,7 @@ def write_segment_summary(tenant_id: str, run_id: str, summary_rows: list[dict])
     if db is None:
         return
     db.collection("tenants").document(tenant_id).collection("segments").document(run_id).set(
-        {"segments": summary_rows, "created_at": firestore.SERVER_TIMESTAMP}
+        {"segments": summary_rows, "created_at": _firestore().SERVER_TIMESTAMP}
     )
 
 
@@ -134,7 +143,7 @@ def write_prediction(
         "payload": payload,
         "result": result,
         "batch_file_url": batch_file_url,
-        "created_at": firestore.SERVER_TIMESTAMP,
+        "created_at": _firestore().SERVER_TIMESTAMP,
     }
     db.collection("tenants").document(tenant_id).collection("predictions").document(prediction_id).set(data)
 
@@ -155,8 +164,8 @@ def write_queue_job(
         "kind": kind,
         "status": status,
         "payload": payload,
-        "created_at": firestore.SERVER_TIMESTAMP,
-        "updated_at": firestore.SERVER_TIMESTAMP,
+        "created_at": _firestore().SERVER_TIMESTAMP,
+        "updated_at": _firestore().SERVER_TIMESTAMP,
     }
     if result is not None:
         data["result"] = result
@@ -167,7 +176,7 @@ def update_queue_job(tenant_id: str, queue_id: str, updates: Dict[str, Any]) ->
     db = get_firestore()
     if db is None:
         return
-    payload = {**updates, "updated_at": firestore.SERVER_TIMESTAMP}
+    payload = {**updates, "updated_at": _firestore().SERVER_TIMESTAMP}
     db.collection("tenants").document(tenant_id).collection("queue_jobs").document(queue_id).set(payload, merge=True)
 
 
@@ -182,7 +191,7 @@ def write_notification(
     data = {
         **payload,
         "read_at": None,
-        "created_at": firestore.SERVER_TIMESTAMP,
+        "created_at": _firestore().SERVER_TIMESTAMP,
     }
     db.collection("tenants").document(tenant_id).collection("notifications").document(notification_id).set(data)
 
@@ -248,7 +257,7 @@ def list_predictions(tenant_id: str, limit: int = 100) -> list[dict]:
         db.collection("tenants")
         .document(tenant_id)
         .collection("predictions")
-        .order_by("created_at", direction=firestore.Query.DESCENDING)
+        .order_by("created_at", direction=_firestore().Query.DESCENDING)
         .limit(limit)
         .stream()
     )
@@ -273,7 +282,7 @@ def update_prediction(tenant_id: str, prediction_id: str, updates: Dict[str, Any
     db = get_firestore()
     if db is None:
         return
-    payload = {**updates, "updated_at": firestore.SERVER_TIMESTAMP}
+    payload = {**updates, "updated_at": _firestore().SERVER_TIMESTAMP}
     db.collection("tenants").document(tenant_id).collection("predictions").document(prediction_id).set(
         payload,
         merge=True,
@@ -314,7 +323,7 @@ def delete_model(tenant_id: str, model_id: str) -> None:
     tenant_ref.collection("segments").document(model_id).delete()
     tenant_doc = tenant_ref.get()
     if tenant_doc.exists and tenant_doc.to_dict().get("default_model") == model_id:
-        tenant_ref.update({"default_model": firestore.DELETE_FIELD})
+        tenant_ref.update({"default_model": _firestore().DELETE_FIELD})
 
 
 def get_latest_metrics(tenant_id: str) -> Dict[str, float]:
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from profiling import PipelineProfiler, phase
+from resources import split_budget
+
+
+def parameter_grid(grid: Dict[str, Sequence]) -> List[Dict]:
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+@dataclass
+class CandidateResult:
+    params: Dict
+    score: float = -np.inf
+    n_estimators: int = 0
+    best_iteration: Optional[int] = None
+    fit_seconds: float = 0.0
+    rung: int = 0
+    model: object = field(default=None, repr=False)
+
+    def stopped_early(self, early_stopping_rounds: int) -> bool:
+        # Validation loss stopped improving before the tree budget ran out, so
+        # a larger budget would produce the same model.
+        return (
+            self.best_iteration is not None
+            and self.n_estimators - (self.best_iteration + 1) >= early_stopping_rounds
+        )
+
+    def to_log(self) -> Dict:
+        return {
+            "params": self.params,
+            "score": float(self.score),
+            "n_estimators": self.n_estimators,
+            "best_iteration": self.best_iteration,
+            "fit_seconds": round(self.fit_seconds, 4),
+            "rung": self.rung,
+        }
+
+
+def successive_halving(
+    fit_and_score: Callable[[Dict, int, int], Tuple[object, float]],
+    candidates: Sequence[Dict],
+    max_estimators: int,
+    min_estimators: int = 50,
+    eta: int = 3,
+    early_stopping_rounds: int = 30,
+    n_threads: int = 1,
+    name: str = "xgb",
+    profiler: Optional[PipelineProfiler] = None,
+) -> Tuple[CandidateResult, List[CandidateResult]]:
+    # Every candidate is first fitted with a small tree budget; only the best
+    # 1/eta go on to the next rung with eta times more trees, and the last
+    # survivor gets the full budget (early stopping usually ends it sooner).
+    # Each rung splits the thread budget between concurrent fits (XGBoost
+    # releases the GIL while training) and threads per fit, so late rungs with
+    # few survivors still use the whole budget. The higher score wins.
+    results = [CandidateResult(params=dict(params)) for params in candidates]
+    survivors = list(results)
+    # Grid position of each candidate, naming its profiled fits.
+    positions = {id(candidate): index for index, candidate in enumerate(results)}
+    budget = max_estimators if len(results) == 1 else min(min_estimators, max_estimators)
+    rung = 0
+
+    def run(candidate: CandidateResult, n_jobs: int) -> None:
+        start = time.perf_counter()
+        with phase(profiler, f"{name}_c{positions[id(candidate)]}_rung{rung}"):
+            model, score = fit_and_score(candidate.params, budget, n_jobs)
+        candidate.fit_seconds += time.perf_counter() - start
+        candidate.model = model
+        candidate.score = score
+        candidate.n_estimators = budget
+        candidate.best_iteration = getattr(model, "best_iteration", None)
+        candidate.rung = rung
+
+    while True:
+        pending = [c for c in survivors if not c.stopped_early(early_stopping_rounds)]
+        if pending:
+            workers, n_jobs = split_budget(n_threads, len(pending))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(lambda c: run(c, n_jobs), pending))
+        if len(survivors) <= 1 or budget >= max_estimators:
+            break
+        survivors.sort(key=lambda c: c.score, reverse=True)
+        for dropped in survivors[max(1, len(survivors) // eta):]:
+            dropped.model = None
+        survivors = survivors[: max(1, len(survivors) // eta)]
+        budget = max_estimators if len(survivors) == 1 else min(max_estimators, budget * eta)
+        rung += 1
+
+    best = max(survivors, key=lambda c: c.score)
+    return best, results
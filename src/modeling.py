@@ -1,12 +1,16 @@
 from __future__ import annotations
 
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Tuple
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
 import joblib
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
+from sklearn.base import clone
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import (
     accuracy_score,
@@ -16,12 +20,21 @@ from sklearn.metrics import (
 )
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
 
-try:
-    from xgboost import XGBClassifier, XGBRegressor
-except ImportError:  # pragma: no cover
-    XGBClassifier = None
-    XGBRegressor = None
+from model_search import CandidateResult, parameter_grid, successive_halving
+from profiling import PipelineProfiler, phase
+from resources import available_cpus, split_budget
+
+
+def _xgb_estimator(name: str):
+    # xgboost is imported on first use so loading this module (and prediction
+    # code that only unpickles models) does not pay for it.
+    try:
+        import xgboost
+    except ImportError:  # pragma: no cover
+        raise ImportError(f"xgboost is required for {name}") from None
+    return getattr(xgboost, name)
 
 
 @dataclass
@@ -33,25 +46,130 @@ class ModelArtifacts:
     ltv_xgb: object
 
 
-def select_kmeans_k(X: np.ndarray, k_range: Tuple[int, int], random_state: int) -> Tuple[int, Dict[int, float]]:
-    from sklearn.metrics import silhouette_score
+K_CRITERIA = ("silhouette", "calinski_harabasz", "elbow")
+
+
+def _fit_kmeans(X: np.ndarray, k: int, random_state: int, minibatch: bool):
+    if minibatch:
+        return MiniBatchKMeans(
+            n_clusters=k, random_state=random_state, n_init=3, batch_size=4096
+        ).fit(X)
+    return KMeans(n_clusters=k, random_state=random_state, n_init=10).fit(X)
+
+
+def _stratified_sample(labels: np.ndarray, sample_size: int, rng: np.random.Generator) -> np.ndarray:
+    # Proportional per-cluster draw; small clusters keep enough points for
+    # their silhouette to be estimated at all.
+    clusters, counts = np.unique(labels, return_counts=True)
+    take = np.maximum(np.round(counts * sample_size / len(labels)).astype(int), 2)
+    take = np.minimum(take, counts)
+    picked = [
+        rng.choice(np.flatnonzero(labels == cluster), size=n, replace=False)
+        for cluster, n in zip(clusters, take)
+    ]
+    return np.sort(np.concatenate(picked))
+
+
+def _elbow_k(inertias: Dict[int, float]) -> int:
+    # Knee of the inertia curve: the k farthest below the straight line between
+    # the first and last k, on both axes scaled to [0, 1].
+    ks = np.array(sorted(inertias), dtype=np.float64)
+    values = np.array([inertias[int(k)] for k in ks])
+    if len(ks) < 3 or values[0] == values[-1]:
+        return int(ks[0])
+    x = (ks - ks[0]) / (ks[-1] - ks[0])
+    y = (values - values[-1]) / (values[0] - values[-1])
+    return int(ks[np.argmax((1.0 - x) - y)])
+
+
+def _score_kmeans(
+    X: np.ndarray, model, criterion: str, sample_size: int, random_state: int
+) -> float:
+    from sklearn import config_context
+    from sklearn.metrics import calinski_harabasz_score, silhouette_score
+
+    if criterion == "elbow":
+        return float(model.inertia_)
+    labels = model.labels_
+    if criterion == "calinski_harabasz":
+        return float(calinski_harabasz_score(X, labels))
+    # Seeded per k so the sample does not depend on which worker finishes first.
+    rng = np.random.default_rng([random_state, model.n_clusters])
+    rows = _stratified_sample(labels, sample_size, rng) if len(X) > sample_size else slice(None)
+    # Pairwise distances are computed in blocks of at most working_memory MiB.
+    with config_context(working_memory=128):
+        return float(silhouette_score(X[rows], labels[rows]))
+
+
+def _fit_and_score_k(
+    X: np.ndarray,
+    k: int,
+    random_state: int,
+    criterion: str,
+    sample_size: int,
+    minibatch: bool,
+    omp_threads: Optional[int] = None,
+    profiler: Optional[PipelineProfiler] = None,
+) -> Tuple[object, float]:
+    with phase(profiler, f"kmeans_k{k}", rows=len(X)):
+        # OpenMP thread counts are per calling thread, so each sweep worker caps
+        # its own fits to keep concurrent k values from oversubscribing the cores.
+        with threadpool_limits(limits=omp_threads, user_api="openmp"):
+            model = _fit_kmeans(X, k, random_state, minibatch)
+        return model, _score_kmeans(X, model, criterion, sample_size, random_state)
+
+
+def select_kmeans_k(
+    X: np.ndarray,
+    k_range: Tuple[int, int],
+    random_state: int,
+    criterion: str = "silhouette",
+    sample_size: int = 10_000,
+    minibatch_threshold: int = 100_000,
+    n_workers: Optional[int] = None,
+    n_threads: Optional[int] = None,
+    profiler: Optional[PipelineProfiler] = None,
+) -> Tuple[int, Dict[int, float], object]:
+    # Exact for small inputs: with n <= sample_size every point is scored and
+    # below minibatch_threshold each k is a full KMeans fit. Beyond that the
+    # silhouette (O(n^2)) is estimated on a cluster-stratified sample and the
+    # fits use MiniBatchKMeans, so cost stays bounded as customers grow.
+    # k values are fitted concurrently on threads sharing X, splitting the
+    # n_threads budget between concurrent fits and their OpenMP threads; the fitted model
+    # of the winning k is returned so it never has to be refitted.
+    if criterion not in K_CRITERIA:
+        raise ValueError(f"Unknown k selection criterion: {criterion}")
+    ks = list(range(k_range[0], k_range[1] + 1))
+    minibatch = len(X) >= minibatch_threshold
+    budget = n_threads or available_cpus()
+    n_workers, omp_threads = split_budget(budget, min(n_workers or budget, len(ks)))
+    X.setflags(write=False)
+    try:
+        fit = partial(
+            _fit_and_score_k,
+            X,
+            random_state=random_state,
+            criterion=criterion,
+            sample_size=sample_size,
+            minibatch=minibatch,
+            omp_threads=omp_threads,
+            profiler=profiler,
+        )
+        if n_workers > 1:
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                results = dict(zip(ks, executor.map(fit, ks)))
+        else:
+            results = {k: fit(k) for k in ks}
+    finally:
+        X.setflags(write=True)
 
-    scores: Dict[int, float] = {}
-    best_k = k_range[0]
-    best_score = -1.0
-    for k in range(k_range[0], k_range[1] + 1):
-        model = KMeans(n_clusters=k, random_state=random_state, n_init=10)
-        labels = model.fit_predict(X)
-        score = silhouette_score(X, labels)
-        scores[k] = score
-        if score > best_score:
-            best_k = k
-            best_score = score
-    return best_k, scores
+    scores = {k: score for k, (_, score) in results.items()}
+    best_k = _elbow_k(scores) if criterion == "elbow" else max(scores, key=scores.get)
+    return best_k, scores, results[best_k][0]
 
 
-def train_segmentation(features: pd.DataFrame, random_state: int, k_range: Tuple[int, int]) -> Tuple[StandardScaler, KMeans, pd.DataFrame, Dict[int, float]]:
-    seg_features = features[
+def _segment_features(features: pd.DataFrame) -> pd.DataFrame:
+    return features[
         [
             "recency_days",
             "frequency",
@@ -60,125 +178,381 @@ def train_segmentation(features: pd.DataFrame, random_state: int, k_range: Tuple
             "unique_products",
             "avg_interpurchase_days",
         ]
-    ].copy()
-    seg_features = seg_features.astype(np.float32)
+    ].astype(np.float32)
+
+
+def train_segmentation(
+    features: pd.DataFrame,
+    random_state: int,
+    k_range: Tuple[int, int],
+    criterion: str = "silhouette",
+    sample_size: int = 10_000,
+    minibatch_threshold: int = 100_000,
+    n_workers: Optional[int] = None,
+    n_threads: Optional[int] = None,
+    profiler: Optional[PipelineProfiler] = None,
+) -> Tuple[StandardScaler, KMeans, pd.DataFrame, Dict[int, float]]:
     scaler = StandardScaler()
-    X = scaler.fit_transform(seg_features).astype(np.float32, copy=False)
-    best_k, scores = select_kmeans_k(X, k_range, random_state)
-    kmeans = KMeans(n_clusters=best_k, random_state=random_state, n_init=10)
-    features["segment"] = kmeans.fit_predict(X)
+    X = scaler.fit_transform(_segment_features(features)).astype(np.float32, copy=False)
+    _, scores, kmeans = select_kmeans_k(
+        X,
+        k_range,
+        random_state,
+        criterion,
+        sample_size,
+        minibatch_threshold,
+        n_workers,
+        n_threads,
+        profiler,
+    )
+    features["segment"] = kmeans.labels_
     return scaler, kmeans, features, scores
 
 
-def _find_best_threshold(y_true: np.ndarray, y_prob: np.ndarray) -> Tuple[float, float]:
-    best_thresh = 0.5
-    best_acc = -1.0
-    for thresh in np.linspace(0.05, 0.95, 91):
-        preds = (y_prob >= thresh).astype(int)
-        acc = accuracy_score(y_true, preds)
-        if acc > best_acc:
-            best_acc = acc
-            best_thresh = float(thresh)
-    return best_thresh, float(best_acc)
+def update_segmentation(
+    features: pd.DataFrame,
+    scaler: StandardScaler,
+    kmeans,
+    random_state: int,
+    criterion: str = "silhouette",
+    sample_size: int = 10_000,
+) -> Tuple[StandardScaler, KMeans, pd.DataFrame, Dict[int, float]]:
+    # The previous scaler is kept so the previous centers stay in the same
+    # space; k is kept and a single run starts from those centers.
+    X = scaler.transform(_segment_features(features)).astype(np.float32, copy=False)
+    centers = kmeans.cluster_centers_.astype(np.float32)
+    model = clone(kmeans).set_params(init=centers, n_init=1, random_state=random_state).fit(X)
+    features["segment"] = model.labels_
+    scores = {int(model.n_clusters): _score_kmeans(X, model, criterion, sample_size, random_state)}
+    return scaler, model, features, scores
+
+
+THRESHOLD_OBJECTIVES = ("accuracy", "f1", "cost")
+
+
+def threshold_sweep(
+    y_true: np.ndarray, y_prob: np.ndarray, cost_fp: float = 5.0, cost_fn: float = 20.0
+) -> Dict[str, np.ndarray]:
+    # Predicting positive for prob >= t only changes at the distinct
+    # probabilities, so one descending sort and a cumulative sum of positives
+    # give the confusion counts at every useful threshold in O(n log n).
+    y_true = np.asarray(y_true).astype(np.int64)
+    order = np.argsort(-np.asarray(y_prob, dtype=np.float64), kind="stable")
+    probs = np.asarray(y_prob, dtype=np.float64)[order]
+    tp_cum = np.cumsum(y_true[order])
+    last_of_value = np.flatnonzero(np.diff(probs, append=-np.inf))
+    # Leading entry: a threshold above every probability (nothing predicted positive).
+    top = probs[0] if len(probs) else 1.0
+    thresholds = np.concatenate([[np.nextafter(top, np.inf)], probs[last_of_value]])
+    tp = np.concatenate([[0], tp_cum[last_of_value]])
+    fp = np.concatenate([[0], last_of_value + 1 - tp_cum[last_of_value]])
+    positives = int(y_true.sum())
+    negatives = len(y_true) - positives
+    fn = positives - tp
+    f1_denominator = 2 * tp + fp + fn
+    return {
+        "threshold": thresholds,
+        "accuracy": (tp + negatives - fp) / max(len(y_true), 1),
+        "f1": np.divide(2 * tp, f1_denominator, out=np.zeros(len(tp)), where=f1_denominator > 0),
+        "cost": fp * cost_fp + fn * cost_fn,
+    }
+
+
+def _find_best_threshold(
+    y_true: np.ndarray,
+    y_prob: np.ndarray,
+    objective: str = "accuracy",
+    cost_fp: float = 5.0,
+    cost_fn: float = 20.0,
+) -> Tuple[float, Dict[str, float]]:
+    if objective not in THRESHOLD_OBJECTIVES:
+        raise ValueError(f"Unknown threshold objective: {objective}")
+    sweep = threshold_sweep(y_true, y_prob, cost_fp, cost_fn)
+    best = int(np.argmin(sweep["cost"]) if objective == "cost" else np.argmax(sweep[objective]))
+    return float(sweep["threshold"][best]), {name: float(sweep[name][best]) for name in THRESHOLD_OBJECTIVES}
+
+
+def _objective_score(objective: str, val_metrics: Dict[str, float]) -> float:
+    # Higher is better for every objective.
+    return -val_metrics["cost"] if objective == "cost" else val_metrics[objective]
+
+
+# Shared by every XGBoost candidate; the search varies XGB_SEARCH_GRID and
+# the number of trees.
+XGB_FIXED_PARAMS = {
+    "subsample": 0.8,
+    "colsample_bytree": 0.8,
+    "tree_method": "hist",
+    "max_bin": 128,
+    "verbosity": 0,
+}
+XGB_SEARCH_GRID = {
+    "max_depth": [3, 4, 5, 6],
+    "learning_rate": [0.03, 0.05, 0.1],
+    "min_child_weight": [1, 5],
+}
+
+
+def _search_candidates(n_candidates: int, random_state: int) -> List[Dict]:
+    # The same grid points for a given random_state whatever the thread budget.
+    grid = parameter_grid(XGB_SEARCH_GRID)
+    n = min(len(grid), max(1, n_candidates))
+    picked = np.random.default_rng(random_state).choice(len(grid), size=n, replace=False)
+    return [grid[i] for i in sorted(picked)]
+
+
+def _search_summary(best: CandidateResult, candidates: List[CandidateResult], seconds: float) -> Dict:
+    return {
+        "params": {**best.params, "n_estimators": best.n_estimators, "best_iteration": best.best_iteration},
+        "seconds": round(seconds, 4),
+        "candidates": [c.to_log() for c in candidates],
+    }
 
 
 def train_churn_models(
-    features: pd.DataFrame, random_state: int
+    features: pd.DataFrame,
+    random_state: int,
+    threshold_objective: str = "accuracy",
+    cost_fp: float = 5.0,
+    cost_fn: float = 20.0,
+    n_threads: int = 1,
+    max_estimators: int = 600,
+    n_candidates: int = 4,
+    early_stopping_rounds: int = 30,
+    search_log: Optional[Dict] = None,
+    profiler: Optional[PipelineProfiler] = None,
 ) -> Tuple[LogisticRegression, object, Dict[str, float]]:
-    X = features[
-        [
-            "recency_days",
-            "frequency",
-            "monetary",
-            "avg_basket_value",
-            "unique_products",
-            "avg_interpurchase_days",
-            "purchase_span_days",
-        ]
-    ].to_numpy(dtype=np.float32)
-    y = features["churn_label"].to_numpy(dtype=np.int8)
-
-    X_temp, X_test, y_temp, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=random_state, stratify=y
-    )
-    X_train, X_val, y_train, y_val = train_test_split(
-        X_temp, y_temp, test_size=0.25, random_state=random_state, stratify=y_temp
-    )
+    X, y = _model_matrix(features, "churn_label", np.int8)
+    train, val, test = _split_rows(y, random_state, stratify=True, groups=_split_groups(features))
+    X_train, X_val, y_train, y_val = X[train], X[val], y[train], y[val]
 
     logreg = LogisticRegression(max_iter=1000)
-    logreg.fit(X_train, y_train)
-    logreg_val_prob = logreg.predict_proba(X_val)[:, 1]
-    logreg_thresh, logreg_val_acc = _find_best_threshold(y_val, logreg_val_prob)
-    logreg_test_prob = logreg.predict_proba(X_test)[:, 1]
-    logreg_test_pred = (logreg_test_prob >= logreg_thresh).astype(int)
-    logreg_f1 = f1_score(y_test, logreg_test_pred)
-    logreg_auc = roc_auc_score(y_test, logreg_test_prob)
-    logreg_acc = accuracy_score(y_test, logreg_test_pred)
-
-    if XGBClassifier is None:
-        raise ImportError("xgboost is required for XGBClassifier")
+    with phase(profiler, "churn_logreg", rows=len(X_train)):
+        logreg.fit(X_train, y_train)
 
-    candidate_params = [
-        {"n_estimators": 200, "max_depth": 4, "learning_rate": 0.05},
-        {"n_estimators": 250, "max_depth": 5, "learning_rate": 0.05},
-        {"n_estimators": 300, "max_depth": 5, "learning_rate": 0.03},
-    ]
+    XGBClassifier = _xgb_estimator("XGBClassifier")
 
-    best_xgb = None
-    best_xgb_thresh = 0.5
-    best_xgb_val_acc = -1.0
-    for params in candidate_params:
+    def fit_and_score(params: Dict, n_estimators: int, n_jobs: int) -> Tuple[object, float]:
         model = XGBClassifier(
-            n_estimators=params["n_estimators"],
-            max_depth=params["max_depth"],
-            learning_rate=params["learning_rate"],
-            subsample=0.8,
-            colsample_bytree=0.8,
+            n_estimators=n_estimators,
+            **params,
+            **XGB_FIXED_PARAMS,
+            n_jobs=n_jobs,
             random_state=random_state,
             eval_metric="logloss",
-            tree_method="hist",
-            max_bin=128,
-            n_jobs=1,
-            verbosity=0,
+            early_stopping_rounds=early_stopping_rounds,
         )
-        model.fit(X_train, y_train)
-        val_prob = model.predict_proba(X_val)[:, 1]
-        thresh, val_acc = _find_best_threshold(y_val, val_prob)
-        if val_acc > best_xgb_val_acc:
-            best_xgb = model
-            best_xgb_thresh = thresh
-            best_xgb_val_acc = val_acc
-
-    xgb = best_xgb
+        model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+        _, val_metrics = _find_best_threshold(
+            y_val, model.predict_proba(X_val)[:, 1], threshold_objective, cost_fp, cost_fn
+        )
+        return model, _objective_score(threshold_objective, val_metrics)
+
+    start = time.perf_counter()
+    best, candidates = successive_halving(
+        fit_and_score,
+        _search_candidates(n_candidates, random_state),
+        max_estimators=max_estimators,
+        early_stopping_rounds=early_stopping_rounds,
+        n_threads=n_threads,
+        name="churn_xgb",
+        profiler=profiler,
+    )
+    if search_log is not None:
+        search_log["churn_xgb"] = _search_summary(best, candidates, time.perf_counter() - start)
+    xgb = best.model
+
+    metrics = _evaluate_churn(
+        logreg, xgb, X[val], y[val], X[test], y[test], threshold_objective, cost_fp, cost_fn
+    )
+    return logreg, xgb, metrics
+
+
+def update_churn_models(
+    features: pd.DataFrame,
+    logreg: LogisticRegression,
+    xgb,
+    random_state: int,
+    threshold_objective: str = "accuracy",
+    cost_fp: float = 5.0,
+    cost_fn: float = 20.0,
+    extra_rounds: int = 100,
+    early_stopping_rounds: int = 30,
+    update_rows: Optional[np.ndarray] = None,
+    n_threads: int = 1,
+) -> Tuple[LogisticRegression, object, Dict[str, float]]:
+    # Same split as train_churn_models, so the metrics are comparable with a
+    # full retrain. Boosting continues on the training rows in update_rows
+    # (e.g. customers touched by new transactions) when given.
+    X, y = _model_matrix(features, "churn_label", np.int8)
+    train, val, test = _split_rows(y, random_state, stratify=True, groups=_split_groups(features))
+    boost = _restrict_rows(train, update_rows, y)
+
+    logreg = _warm_start_logreg(logreg, X[train], y[train])
+    xgb = _continue_boosting(
+        xgb, X[boost], y[boost], X[val], y[val], extra_rounds, early_stopping_rounds, n_threads
+    )
+    metrics = _evaluate_churn(
+        logreg, xgb, X[val], y[val], X[test], y[test], threshold_objective, cost_fp, cost_fn
+    )
+    return logreg, xgb, metrics
+
+
+def evaluate_churn_models(
+    features: pd.DataFrame,
+    logreg: LogisticRegression,
+    xgb,
+    random_state: int,
+    threshold_objective: str = "accuracy",
+    cost_fp: float = 5.0,
+    cost_fn: float = 20.0,
+) -> Dict[str, float]:
+    # Metrics of existing models on the validation/test split train_churn_models
+    # uses for these features, comparable with a fresh train or update.
+    X, y = _model_matrix(features, "churn_label", np.int8)
+    _, val, test = _split_rows(y, random_state, stratify=True, groups=_split_groups(features))
+    return _evaluate_churn(
+        logreg, xgb, X[val], y[val], X[test], y[test], threshold_objective, cost_fp, cost_fn
+    )
+
+
+def _evaluate_churn(
+    logreg: LogisticRegression,
+    xgb,
+    X_val: np.ndarray,
+    y_val: np.ndarray,
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+    threshold_objective: str,
+    cost_fp: float,
+    cost_fn: float,
+) -> Dict[str, float]:
+    logreg_thresh, logreg_val = _find_best_threshold(
+        y_val, logreg.predict_proba(X_val)[:, 1], threshold_objective, cost_fp, cost_fn
+    )
+    logreg_test_prob = logreg.predict_proba(X_test)[:, 1]
+    logreg_test_pred = (logreg_test_prob >= logreg_thresh).astype(int)
+
+    xgb_thresh, xgb_val = _find_best_threshold(
+        y_val, xgb.predict_proba(X_val)[:, 1], threshold_objective, cost_fp, cost_fn
+    )
     xgb_test_prob = xgb.predict_proba(X_test)[:, 1]
-    xgb_test_pred = (xgb_test_prob >= best_xgb_thresh).astype(int)
-    xgb_f1 = f1_score(y_test, xgb_test_pred)
-    xgb_auc = roc_auc_score(y_test, xgb_test_prob)
-    xgb_acc = accuracy_score(y_test, xgb_test_pred)
+    xgb_test_pred = (xgb_test_prob >= xgb_thresh).astype(int)
 
     baseline_pred = np.zeros_like(y_test)
-    baseline_acc = accuracy_score(y_test, baseline_pred)
-    baseline_f1 = f1_score(y_test, baseline_pred)
-
-    metrics = {
-        "baseline_acc": baseline_acc,
-        "baseline_f1": baseline_f1,
-        "logreg_f1": logreg_f1,
-        "logreg_auc": logreg_auc,
-        "logreg_acc": logreg_acc,
+    return {
+        "baseline_acc": accuracy_score(y_test, baseline_pred),
+        "baseline_f1": f1_score(y_test, baseline_pred),
+        "logreg_f1": f1_score(y_test, logreg_test_pred),
+        "logreg_auc": roc_auc_score(y_test, logreg_test_prob),
+        "logreg_acc": accuracy_score(y_test, logreg_test_pred),
         "logreg_best_threshold": float(logreg_thresh),
-        "logreg_val_acc": float(logreg_val_acc),
-        "xgb_f1": xgb_f1,
-        "xgb_auc": xgb_auc,
-        "xgb_acc": xgb_acc,
-        "xgb_best_threshold": float(best_xgb_thresh),
-        "xgb_val_acc": float(best_xgb_val_acc),
+        "logreg_val_acc": logreg_val["accuracy"],
+        "logreg_val_f1": logreg_val["f1"],
+        "logreg_val_cost": logreg_val["cost"],
+        "xgb_f1": f1_score(y_test, xgb_test_pred),
+        "xgb_auc": roc_auc_score(y_test, xgb_test_prob),
+        "xgb_acc": accuracy_score(y_test, xgb_test_pred),
+        "xgb_best_threshold": float(xgb_thresh),
+        "xgb_val_acc": xgb_val["accuracy"],
+        "xgb_val_f1": xgb_val["f1"],
+        "xgb_val_cost": xgb_val["cost"],
     }
 
-    return logreg, xgb, metrics
+
+def train_ltv_model(
+    features: pd.DataFrame,
+    random_state: int,
+    n_threads: int = 1,
+    max_estimators: int = 600,
+    n_candidates: int = 4,
+    early_stopping_rounds: int = 30,
+    search_log: Optional[Dict] = None,
+    profiler: Optional[PipelineProfiler] = None,
+) -> Tuple[object, Dict[str, float]]:
+    X, y = _model_matrix(features, "future_spend", np.float32)
+    train, val, test = _split_rows(y, random_state, stratify=False, groups=_split_groups(features))
+    X_train, X_val, y_train, y_val = X[train], X[val], y[train], y[val]
+
+    XGBRegressor = _xgb_estimator("XGBRegressor")
+
+    def fit_and_score(params: Dict, n_estimators: int, n_jobs: int) -> Tuple[object, float]:
+        model = XGBRegressor(
+            n_estimators=n_estimators,
+            **params,
+            **XGB_FIXED_PARAMS,
+            n_jobs=n_jobs,
+            random_state=random_state,
+            early_stopping_rounds=early_stopping_rounds,
+        )
+        model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+        val_rmse = np.sqrt(np.mean((model.predict(X_val) - y_val) ** 2))
+        return model, -float(val_rmse)
+
+    start = time.perf_counter()
+    best, candidates = successive_halving(
+        fit_and_score,
+        _search_candidates(n_candidates, random_state),
+        max_estimators=max_estimators,
+        early_stopping_rounds=early_stopping_rounds,
+        n_threads=n_threads,
+        name="ltv_xgb",
+        profiler=profiler,
+    )
+    if search_log is not None:
+        search_log["ltv_xgb"] = _search_summary(best, candidates, time.perf_counter() - start)
+
+    # The validation rows only pick the candidate and its number of trees; the
+    # final model trains on them too, i.e. on every row outside the test split.
+    n_estimators = best.n_estimators if best.best_iteration is None else best.best_iteration + 1
+    xgb = XGBRegressor(
+        n_estimators=n_estimators,
+        **best.params,
+        **XGB_FIXED_PARAMS,
+        n_jobs=n_threads,
+        random_state=random_state,
+    )
+    fit_rows = np.concatenate([train, val])
+    with phase(profiler, "ltv_xgb_refit", rows=len(fit_rows)):
+        xgb.fit(X[fit_rows], y[fit_rows])
+    return xgb, _evaluate_ltv(xgb, X[test], y[test])
+
+
+def update_ltv_model(
+    features: pd.DataFrame,
+    xgb,
+    random_state: int,
+    extra_rounds: int = 100,
+    early_stopping_rounds: int = 30,
+    update_rows: Optional[np.ndarray] = None,
+    n_threads: int = 1,
+) -> Tuple[object, Dict[str, float]]:
+    X, y = _model_matrix(features, "future_spend", np.float32)
+    train, val, test = _split_rows(y, random_state, stratify=False, groups=_split_groups(features))
+    boost = _restrict_rows(train, update_rows)
+    xgb = _continue_boosting(
+        xgb, X[boost], y[boost], X[val], y[val], extra_rounds, early_stopping_rounds, n_threads
+    )
+    return xgb, _evaluate_ltv(xgb, X[test], y[test])
+
+
+def evaluate_ltv_model(features: pd.DataFrame, xgb, random_state: int) -> Dict[str, float]:
+    X, y = _model_matrix(features, "future_spend", np.float32)
+    _, _, test = _split_rows(y, random_state, stratify=False, groups=_split_groups(features))
+    return _evaluate_ltv(xgb, X[test], y[test])
+
+
+def _evaluate_ltv(xgb, X_test: np.ndarray, y_test: np.ndarray) -> Dict[str, float]:
+    preds = xgb.predict(X_test)
+    mae = np.mean(np.abs(preds - y_test))
+    rmse = np.sqrt(np.mean((preds - y_test) ** 2))
+    return {
+        "ltv_mae": float(mae),
+        "ltv_rmse": float(rmse),
+    }
 
 
-def train_ltv_model(features: pd.DataFrame, random_state: int) -> Tuple[object, Dict[str, float]]:
+def _model_matrix(features: pd.DataFrame, target: str, target_dtype) -> Tuple[np.ndarray, np.ndarray]:
     X = features[
         [
             "recency_days",
@@ -190,38 +564,110 @@ def train_ltv_model(features: pd.DataFrame, random_state: int) -> Tuple[object,
             "purchase_span_days",
         ]
     ].to_numpy(dtype=np.float32)
-    y = features["future_spend"].to_numpy(dtype=np.float32)
+    return X, features[target].to_numpy(dtype=target_dtype)
+
+
+def _split_groups(features: pd.DataFrame) -> Optional[np.ndarray]:
+    # Stacked rolling-cutoff tables hold one row per customer and cutoff; those
+    # rows are near-identical and each cutoff's label window overlaps the next
+    # cutoffs' history, so a customer's rows must all land in the same split.
+    if "cutoff_date" not in features.columns:
+        return None
+    return features["CustomerID"].to_numpy()
+
+
+def _split_rows(
+    y: np.ndarray, random_state: int, stratify: bool, groups: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # 60/20/20 train/validation/test row indices; splitting indices gives the
+    # same partition as splitting the arrays themselves. With groups, the
+    # groups are split instead (stratified by whether any of their rows is
+    # positive) and each row follows its group.
+    if groups is None:
+        rows = np.arange(len(y))
+        temp, test = train_test_split(
+            rows, test_size=0.2, random_state=random_state, stratify=y if stratify else None
+        )
+        train, val = train_test_split(
+            temp, test_size=0.25, random_state=random_state, stratify=y[temp] if stratify else None
+        )
+        return train, val, test
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=random_state
+    codes, uniques = pd.factorize(groups)
+    labels = pd.Series(y).groupby(codes).max().to_numpy() if stratify else None
+    temp, test = train_test_split(
+        np.arange(len(uniques)), test_size=0.2, random_state=random_state, stratify=labels
     )
-
-    if XGBRegressor is None:
-        raise ImportError("xgboost is required for XGBRegressor")
-
-    xgb = XGBRegressor(
-        n_estimators=300,
-        max_depth=5,
-        learning_rate=0.05,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        random_state=random_state,
-        tree_method="hist",
-        max_bin=128,
-        n_jobs=1,
-        verbosity=0,
+    train, val = train_test_split(
+        temp, test_size=0.25, random_state=random_state, stratify=labels[temp] if stratify else None
     )
-    xgb.fit(X_train, y_train)
-    preds = xgb.predict(X_test)
-    mae = np.mean(np.abs(preds - y_test))
-    rmse = np.sqrt(np.mean((preds - y_test) ** 2))
-
-    metrics = {
-        "ltv_mae": float(mae),
-        "ltv_rmse": float(rmse),
-    }
-
-    return xgb, metrics
+    split = np.empty(len(uniques), dtype=np.int8)
+    split[train], split[val], split[test] = 0, 1, 2
+    row_split = split[codes]
+    return tuple(np.flatnonzero(row_split == i) for i in range(3))
+
+
+def _restrict_rows(
+    train: np.ndarray, update_rows: Optional[np.ndarray], y: Optional[np.ndarray] = None
+) -> np.ndarray:
+    # Too few updated rows (or a single class) cannot move the model usefully;
+    # continue on the whole training split instead.
+    if update_rows is None:
+        return train
+    subset = train[update_rows[train]]
+    if len(subset) < 100 or (y is not None and len(np.unique(y[subset])) < 2):
+        return train
+    return subset
+
+
+def _continue_boosting(
+    previous,
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_val: np.ndarray,
+    y_val: np.ndarray,
+    extra_rounds: int,
+    early_stopping_rounds: int,
+    n_jobs: int = 1,
+):
+    params = previous.get_params()
+    params.update(
+        n_estimators=extra_rounds, early_stopping_rounds=early_stopping_rounds, n_jobs=n_jobs
+    )
+    model = type(previous)(**params)
+    booster = previous.get_booster()
+    best_iteration = getattr(previous, "best_iteration", None)
+    if best_iteration is not None:
+        # Trees past the previous early-stopping point are dropped, not built on.
+        booster = booster[: best_iteration + 1]
+    model.fit(X_train, y_train, eval_set=[(X_val, y_val)], xgb_model=booster, verbose=False)
+    return model
+
+
+def _warm_start_logreg(previous: LogisticRegression, X: np.ndarray, y: np.ndarray) -> LogisticRegression:
+    model = clone(previous).set_params(warm_start=True)
+    model.coef_ = previous.coef_.copy()
+    model.intercept_ = previous.intercept_.copy()
+    return model.fit(X, y)
+
+
+def quality_degraded(
+    metrics: Dict[str, float],
+    reference: Dict[str, float],
+    auc_tolerance: float,
+    rmse_tolerance: float,
+) -> List[str]:
+    # Reasons an incrementally updated model is worse than the reference
+    # (the last full retrain scored on the same test rows); empty when it is
+    # within tolerance.
+    reasons = []
+    if metrics["xgb_auc"] < reference.get("xgb_auc", -np.inf) - auc_tolerance:
+        reasons.append(f"churn AUC {metrics['xgb_auc']:.4f} < {reference['xgb_auc']:.4f} - {auc_tolerance}")
+    if metrics["ltv_rmse"] > reference.get("ltv_rmse", np.inf) * (1 + rmse_tolerance):
+        reasons.append(
+            f"LTV RMSE {metrics['ltv_rmse']:.4f} > {reference['ltv_rmse']:.4f} * (1 + {rmse_tolerance})"
+        )
+    return reasons
 
 
 def compute_business_cost(y_true: np.ndarray, y_prob: np.ndarray, cost_fp: float, cost_fn: float) -> float:
@@ -231,6 +677,16 @@ def compute_business_cost(y_true: np.ndarray, y_prob: np.ndarray, cost_fp: float
     return float(fp * cost_fp + fn * cost_fn)
 
 
+def load_artifacts(artifacts_path: str) -> ModelArtifacts:
+    return ModelArtifacts(
+        scaler=joblib.load(f"{artifacts_path}/scaler.joblib"),
+        kmeans=joblib.load(f"{artifacts_path}/kmeans.joblib"),
+        churn_logreg=joblib.load(f"{artifacts_path}/churn_logreg.joblib"),
+        churn_xgb=joblib.load(f"{artifacts_path}/churn_xgb.joblib"),
+        ltv_xgb=joblib.load(f"{artifacts_path}/ltv_xgb.joblib"),
+    )
+
+
 def save_artifacts(artifacts_path: str, artifacts: ModelArtifacts) -> None:
     joblib.dump(artifacts.scaler, f"{artifacts_path}/scaler.joblib")
     joblib.dump(artifacts.kmeans, f"{artifacts_path}/kmeans.joblib")
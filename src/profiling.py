@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+_CLEAR_REFS = Path("/proc/self/clear_refs")
+_STATUS = Path("/proc/self/status")
+
+
+def _peak_rss_bytes() -> int:
+    # VmHWM since the last reset on Linux, otherwise the process lifetime peak.
+    try:
+        with open(_STATUS, "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _reset_peak_rss() -> None:
+    try:
+        _CLEAR_REFS.write_text("5")
+    except OSError:
+        pass
+
+
+# Wall time, CPU time, peak RSS and row counts per named phase of a run.
+# Phases on the main thread may nest: the RSS high-water mark is reset on entry
+# so each phase reports its own peak, and the peak so far is carried to the
+# phases still open around it. Phases on worker threads (one per k or XGBoost
+# candidate) record their own thread's CPU time and no memory.
+class PipelineProfiler:
+    def __init__(self) -> None:
+        self.records: List[Dict] = []
+        self._open: List[Dict] = []
+        self._peaks: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str, rows: Optional[int] = None) -> Iterator[Dict]:
+        record = {"name": name, "rows": rows}
+        on_main = threading.current_thread() is threading.main_thread()
+        with self._lock:
+            self.records.append(record)
+        if on_main:
+            self._carry_peak()
+            _reset_peak_rss()
+            self._open.append(record)
+        cpu_clock = time.process_time if on_main else time.thread_time
+        start_wall, start_cpu = time.perf_counter(), cpu_clock()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - start_wall
+            record["cpu_seconds"] = cpu_clock() - start_cpu
+            if on_main:
+                self._carry_peak()
+                self._open.pop()
+                record["peak_rss_mb"] = self._peaks.pop(id(record)) / 2**20
+
+    def _carry_peak(self) -> None:
+        peak = _peak_rss_bytes()
+        for record in self._open:
+            self._peaks[id(record)] = max(self._peaks.get(id(record), 0), peak)
+
+    def metrics(self) -> Dict[str, float]:
+        metrics: Dict[str, float] = {}
+        for record in self.records:
+            for key in ("wall_seconds", "cpu_seconds", "peak_rss_mb", "rows"):
+                if record.get(key) is not None:
+                    metrics[f"{record['name']}_{key}"] = float(record[key])
+        return metrics
+
+    def write(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"phases": self.records}, f, indent=2, default=str)
+        return path
+
+
+def phase(profiler: Optional[PipelineProfiler], name: str, rows: Optional[int] = None):
+    # Lets instrumented code take an optional profiler.
+    if profiler is None:
+        return nullcontext({})
+    return profiler.phase(name, rows)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import os
+from typing import Optional, Tuple
+
+from threadpoolctl import threadpool_limits
+
+# Read by BLAS/OpenMP runtimes when they load, including in child processes.
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def available_cpus() -> int:
+    # CPUs this process may run on (container/affinity aware where supported).
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def resolve_thread_budget(requested: Optional[int] = None) -> int:
+    if requested is None or requested <= 0:
+        return available_cpus()
+    return min(requested, available_cpus())
+
+
+def apply_thread_budget(threads: int) -> None:
+    # Caps every thread pool of the job to the budget: the environment covers
+    # runtimes loaded later and subprocesses, threadpoolctl the BLAS/OpenMP
+    # libraries already loaded by numpy/scikit-learn/xgboost.
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    threadpool_limits(limits=threads)
+
+
+def split_budget(threads: int, tasks: int) -> Tuple[int, int]:
+    # (concurrent workers, threads per worker) for running `tasks` jobs in
+    # parallel within `threads`.
+    workers = max(1, min(threads, tasks))
+    return workers, max(1, threads // workers)
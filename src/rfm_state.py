@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from columnar import read_columnar, write_columnar
+from data_pipeline import row_fingerprints
+from features import compute_avg_interpurchase_days
+
+AGGREGATE_COLUMNS = [
+    "rows",
+    "monetary",
+    "quantity",
+    "first_purchase",
+    "last_purchase",
+    "frequency",
+    "unique_products",
+]
+
+
+# Distinct (customer, value) pairs kept as sorted fingerprints with the owning
+# customer alongside, so merges can tell which customer gained a new distinct value.
+class _PairKeys:
+    def __init__(self, hashes: Optional[np.ndarray] = None, customers: Optional[np.ndarray] = None) -> None:
+        self.hashes = np.empty(0, dtype=np.uint64) if hashes is None else hashes
+        self.customers = np.empty(0, dtype=np.int64) if customers is None else customers
+
+    def add(self, hashes: np.ndarray, customers: np.ndarray) -> np.ndarray:
+        new = ~pd.Series(hashes).duplicated().to_numpy()
+        if len(self.hashes):
+            pos = np.searchsorted(self.hashes, hashes)
+            pos[pos == len(self.hashes)] = 0
+            new &= self.hashes[pos] != hashes
+        # Insert the sorted delta into the sorted keys instead of re-sorting everything.
+        order = np.argsort(hashes[new])
+        added_hashes = hashes[new][order]
+        positions = np.searchsorted(self.hashes, added_hashes)
+        self.hashes = np.insert(self.hashes, positions, added_hashes)
+        self.customers = np.insert(self.customers, positions, customers[new][order])
+        return new
+
+
+class RFMState:
+    def __init__(self) -> None:
+        self.aggregates = pd.DataFrame(
+            {
+                "rows": pd.Series(dtype="int64"),
+                "monetary": pd.Series(dtype="float64"),
+                "quantity": pd.Series(dtype="float64"),
+                "first_purchase": pd.Series(dtype="datetime64[ns]"),
+                "last_purchase": pd.Series(dtype="datetime64[ns]"),
+                "frequency": pd.Series(dtype="int64"),
+                "unique_products": pd.Series(dtype="int64"),
+            },
+            index=pd.Index([], dtype="int64", name="CustomerID"),
+        )
+        self.invoices = _PairKeys()
+        self.products = _PairKeys()
+        self.source_parts: List[str] = []
+
+    def update(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        customers = df["CustomerID"].to_numpy(dtype=np.int64)
+        new_invoice = self.invoices.add(row_fingerprints(df, ["CustomerID", "InvoiceNo"]), customers)
+        new_product = self.products.add(row_fingerprints(df, ["CustomerID", "StockCode"]), customers)
+        delta = (
+            pd.DataFrame(
+                {
+                    "CustomerID": customers,
+                    "TotalPrice": df["TotalPrice"].to_numpy(dtype=np.float64),
+                    "Quantity": df["Quantity"].to_numpy(dtype=np.float64),
+                    "InvoiceDate": df["InvoiceDate"].to_numpy(dtype="datetime64[ns]"),
+                    "new_invoice": new_invoice,
+                    "new_product": new_product,
+                }
+            )
+            .groupby("CustomerID")
+            .agg(
+                rows=("TotalPrice", "size"),
+                monetary=("TotalPrice", "sum"),
+                quantity=("Quantity", "sum"),
+                first_purchase=("InvoiceDate", "min"),
+                last_purchase=("InvoiceDate", "max"),
+                frequency=("new_invoice", "sum"),
+                unique_products=("new_product", "sum"),
+            )
+        )
+        self._combine(delta)
+
+    def merge(self, other: "RFMState") -> None:
+        # Counts of distinct invoices/products only grow by pairs this state has not seen.
+        new_invoice = self.invoices.add(other.invoices.hashes, other.invoices.customers)
+        new_product = self.products.add(other.products.hashes, other.products.customers)
+        delta = other.aggregates.copy()
+        delta["frequency"] = _count_by_customer(other.invoices.customers[new_invoice], delta.index)
+        delta["unique_products"] = _count_by_customer(other.products.customers[new_product], delta.index)
+        self._combine(delta)
+        self.source_parts = sorted(set(self.source_parts) | set(other.source_parts))
+
+    def _combine(self, delta: pd.DataFrame) -> None:
+        delta = delta[AGGREGATE_COLUMNS]
+        pos = self.aggregates.index.get_indexer(delta.index)
+        hit = pos >= 0
+        if hit.any():
+            # Only customers present in the delta are touched.
+            current = self.aggregates.iloc[pos[hit]]
+            update = delta[hit]
+            merged = pd.DataFrame(
+                {
+                    "rows": current["rows"].to_numpy() + update["rows"].to_numpy(),
+                    "monetary": current["monetary"].to_numpy() + update["monetary"].to_numpy(),
+                    "quantity": current["quantity"].to_numpy() + update["quantity"].to_numpy(),
+                    "first_purchase": np.minimum(
+                        current["first_purchase"].to_numpy(), update["first_purchase"].to_numpy()
+                    ),
+                    "last_purchase": np.maximum(
+                        current["last_purchase"].to_numpy(), update["last_purchase"].to_numpy()
+                    ),
+                    "frequency": current["frequency"].to_numpy() + update["frequency"].to_numpy(),
+                    "unique_products": current["unique_products"].to_numpy()
+                    + update["unique_products"].to_numpy(),
+                }
+            )
+            for i, col in enumerate(AGGREGATE_COLUMNS):
+                self.aggregates.iloc[pos[hit], i] = merged[col].to_numpy()
+        if (~hit).any():
+            added = delta[~hit].astype(self.aggregates.dtypes.to_dict())
+            self.aggregates = pd.concat([self.aggregates, added]) if len(self.aggregates) else added
+
+    def to_rfm(self, snapshot_date: pd.Timestamp) -> pd.DataFrame:
+        agg = self.aggregates.sort_index()
+        rfm = pd.DataFrame(
+            {
+                "CustomerID": agg.index.to_numpy(),
+                "recency_days": (snapshot_date - agg["last_purchase"]).dt.days.to_numpy(),
+                "frequency": agg["frequency"].to_numpy(),
+                "monetary": agg["monetary"].to_numpy(),
+                "unique_products": agg["unique_products"].to_numpy(),
+                "avg_basket_value": (agg["monetary"] / agg["rows"]).to_numpy(),
+                "avg_quantity": (agg["quantity"] / agg["rows"]).to_numpy(),
+                "purchase_span_days": (agg["last_purchase"] - agg["first_purchase"]).dt.days.to_numpy(),
+            }
+        )
+        rfm["CustomerID"] = rfm["CustomerID"].astype("Int64")
+        rfm["avg_interpurchase_days"] = compute_avg_interpurchase_days(
+            rfm["purchase_span_days"].to_numpy(), rfm["frequency"].to_numpy()
+        )
+        return rfm
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        write_columnar(self.aggregates.reset_index(), path / "aggregates.arrow")
+        np.savez(
+            path / "pairs.npz",
+            invoice_hashes=self.invoices.hashes,
+            invoice_customers=self.invoices.customers,
+            product_hashes=self.products.hashes,
+            product_customers=self.products.customers,
+        )
+        with open(path / "state.json", "w", encoding="utf-8") as f:
+            json.dump({"source_parts": self.source_parts}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["RFMState"]:
+        path = Path(path)
+        if not (path / "state.json").exists():
+            return None
+        state = cls()
+        aggregates = read_columnar(path / "aggregates.arrow").set_index("CustomerID")
+        state.aggregates = aggregates.astype(state.aggregates.dtypes.to_dict())
+        pairs = np.load(path / "pairs.npz")
+        state.invoices = _PairKeys(pairs["invoice_hashes"], pairs["invoice_customers"])
+        state.products = _PairKeys(pairs["product_hashes"], pairs["product_customers"])
+        with open(path / "state.json", "r", encoding="utf-8") as f:
+            state.source_parts = json.load(f)["source_parts"]
+        return state
+
+
+def _count_by_customer(customers: np.ndarray, index: pd.Index) -> np.ndarray:
+    counts = pd.Series(customers).value_counts()
+    return counts.reindex(index, fill_value=0).to_numpy(dtype=np.int64)
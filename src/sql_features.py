@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import importlib.util
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+import pandas as pd
+
+from features import compute_avg_interpurchase_days
+
+# Below this many bytes of cleaned columnar data the in-memory pandas engine is
+# faster than starting a SQL engine.
+DEFAULT_SQL_MIN_BYTES = 2 * 1024**3
+
+_DAY_NS = 86_400 * 10**9
+
+# Per-customer aggregates over the transactions matching {where}; the same
+# columns, order and day arithmetic as features.build_rfm_features.
+_RFM_QUERY = """
+SELECT
+    CustomerID,
+    (epoch_ns(CAST($snapshot AS TIMESTAMP_NS)) - epoch_ns(max(InvoiceDate))) // {day} AS recency_days,
+    count(DISTINCT InvoiceNo) AS frequency,
+    sum(TotalPrice) AS monetary,
+    count(DISTINCT StockCode) AS unique_products,
+    avg(TotalPrice) AS avg_basket_value,
+    avg(Quantity) AS avg_quantity,
+    (epoch_ns(max(InvoiceDate)) - epoch_ns(min(InvoiceDate))) // {day} AS purchase_span_days
+FROM transactions
+WHERE {where}
+GROUP BY CustomerID
+"""
+
+_TIME_SPLIT_QUERY = """
+WITH history AS ({history}),
+churn AS (
+    SELECT CustomerID, count(DISTINCT InvoiceNo) AS future_orders
+    FROM transactions
+    WHERE InvoiceDate > CAST($cutoff AS TIMESTAMP_NS) AND InvoiceDate <= CAST($churn_end AS TIMESTAMP_NS)
+    GROUP BY CustomerID
+),
+ltv AS (
+    SELECT CustomerID, sum(TotalPrice) AS future_spend
+    FROM transactions
+    WHERE InvoiceDate > CAST($cutoff AS TIMESTAMP_NS) AND InvoiceDate <= CAST($ltv_end AS TIMESTAMP_NS)
+    GROUP BY CustomerID
+)
+SELECT
+    history.*,
+    CAST(coalesce(churn.future_orders, 0) AS DOUBLE) AS future_orders,
+    coalesce(ltv.future_spend, 0.0) AS future_spend,
+    CAST(coalesce(churn.future_orders, 0) = 0 AS BIGINT) AS churn_label
+FROM history
+LEFT JOIN churn USING (CustomerID)
+LEFT JOIN ltv USING (CustomerID)
+"""
+
+
+def _sql_backend_available() -> bool:
+    # Checked without importing duckdb, which is only loaded once an engine
+    # is created.
+    return all(importlib.util.find_spec(name) is not None for name in ("duckdb", "pyarrow"))
+
+
+def _require_duckdb() -> None:
+    if not _sql_backend_available():
+        raise ImportError("duckdb and pyarrow are required for the SQL feature backend")
+
+
+def columnar_bytes(sources: Sequence[Path]) -> int:
+    return sum(Path(source).stat().st_size for source in sources)
+
+
+def select_feature_backend(sources: Sequence[Path], min_bytes: int = DEFAULT_SQL_MIN_BYTES) -> str:
+    if not sources or not _sql_backend_available():
+        return "pandas"
+    return "duckdb" if columnar_bytes(sources) >= min_bytes else "pandas"
+
+
+class SQLFeatureEngine:
+    # DuckDB scans the Arrow files lazily through a pyarrow dataset, so only the
+    # per-customer aggregates are held in memory; hash aggregates that outgrow
+    # memory_limit spill to temp_dir.
+    def __init__(
+        self,
+        sources: Sequence[Path],
+        temp_dir: Optional[Path] = None,
+        memory_limit: Optional[str] = None,
+        threads: Optional[int] = None,
+    ) -> None:
+        _require_duckdb()
+        import duckdb
+        import pyarrow.dataset as pa_dataset
+
+        self.con = duckdb.connect()
+        self.con.execute("SET preserve_insertion_order = false")
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        if temp_dir is not None:
+            Path(temp_dir).mkdir(parents=True, exist_ok=True)
+            self.con.execute(f"SET temp_directory = '{Path(temp_dir).as_posix()}'")
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = '{memory_limit}'")
+        self._dataset = pa_dataset.dataset([str(source) for source in sources], format="ipc")
+        self.con.register("transactions", self._dataset)
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self) -> "SQLFeatureEngine":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def max_invoice_date(self) -> pd.Timestamp:
+        # Via epoch_ns: Python datetimes would drop the nanoseconds.
+        (value,) = self.con.execute("SELECT epoch_ns(max(InvoiceDate)) FROM transactions").fetchone()
+        return pd.Timestamp(value, unit="ns")
+
+    def _fetch(self, query: str, params: dict) -> pd.DataFrame:
+        df = self.con.execute(f"{query} ORDER BY CustomerID", params).df()
+        df["CustomerID"] = df["CustomerID"].astype("Int64")
+        # Same derived column as the pandas engine, computed on the fetched frame.
+        span = df["purchase_span_days"].to_numpy()
+        frequency = df["frequency"].to_numpy()
+        position = df.columns.get_loc("purchase_span_days") + 1
+        df.insert(position, "avg_interpurchase_days", compute_avg_interpurchase_days(span, frequency))
+        return df
+
+    def rfm_features(self, snapshot_date: pd.Timestamp) -> pd.DataFrame:
+        query = _RFM_QUERY.format(day=_DAY_NS, where="TRUE")
+        return self._fetch(query, {"snapshot": _timestamp_param(snapshot_date)})
+
+    def time_split_features(
+        self, cutoff_date: pd.Timestamp, churn_window_days: int, ltv_horizon_days: int
+    ) -> pd.DataFrame:
+        history = _RFM_QUERY.format(day=_DAY_NS, where="InvoiceDate <= CAST($cutoff AS TIMESTAMP_NS)")
+        params = {
+            "snapshot": _timestamp_param(cutoff_date + pd.Timedelta(days=1)),
+            "cutoff": _timestamp_param(cutoff_date),
+            "churn_end": _timestamp_param(cutoff_date + pd.Timedelta(days=churn_window_days)),
+            "ltv_end": _timestamp_param(cutoff_date + pd.Timedelta(days=ltv_horizon_days)),
+        }
+        return self._fetch(_TIME_SPLIT_QUERY.format(history=history), params)
+
+    def rolling_time_split_features(
+        self, cutoff_dates: Sequence[pd.Timestamp], churn_window_days: int, ltv_horizon_days: int
+    ) -> pd.DataFrame:
+        frames = []
+        for cutoff_date in sorted(pd.Timestamp(c) for c in cutoff_dates):
+            features = self.time_split_features(cutoff_date, churn_window_days, ltv_horizon_days)
+            features.insert(0, "cutoff_date", cutoff_date)
+            frames.append(features)
+        return pd.concat(frames, ignore_index=True)
+
+
+def _timestamp_param(value: pd.Timestamp) -> str:
+    # ISO strings keep nanoseconds, which datetime parameters would truncate.
+    return pd.Timestamp(value).as_unit("ns").isoformat(sep=" ")
+
+
+def build_feature_tables_sql(
+    sources: Sequence[Path],
+    snapshot_date: pd.Timestamp,
+    cutoff_date: pd.Timestamp,
+    churn_window_days: int,
+    ltv_horizon_days: int,
+    temp_dir: Optional[Path] = None,
+    memory_limit: Optional[str] = None,
+    threads: Optional[int] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    with SQLFeatureEngine(sources, temp_dir, memory_limit, threads) as engine:
+        rfm = engine.rfm_features(snapshot_date)
+        modeling = engine.time_split_features(cutoff_date, churn_window_days, ltv_horizon_days)
+    return rfm, modeling
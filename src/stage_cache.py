@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import joblib
+import pandas as pd
+
+from profiling import PipelineProfiler, phase
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[..., Any]
+    # Upstream stages whose outputs are passed to func as keyword arguments.
+    inputs: Tuple[str, ...] = ()
+    # Config fields the output depends on.
+    config_fields: Tuple[str, ...] = ()
+    # Other values the output depends on, e.g. CLI options.
+    params: Dict[str, Any] = field(default_factory=dict)
+    # Modules whose source is part of the code version, besides func's own.
+    modules: Tuple[str, ...] = ()
+    # Identity of the external data read by a source stage; replaces the
+    # code/config part of the key.
+    fingerprint: Optional[str] = None
+    cache: bool = True
+
+
+def _hash(payload: Any) -> str:
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=20).hexdigest()
+
+
+def code_version(stage: Stage) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    func = getattr(stage.func, "func", stage.func)  # functools.partial
+    digest.update(inspect.getsource(func).encode("utf-8"))
+    for name in stage.modules:
+        digest.update(Path(importlib.import_module(name).__file__).read_bytes())
+    return digest.hexdigest()
+
+
+# Runs stages on demand, caching each output under a key that hashes the
+# stage's code version, config fields, params and the keys of its inputs. Keys
+# are known before anything runs, so a cached output is loaded without running
+# (or loading) its inputs, and a change to one config field only reruns the
+# stages that depend on it.
+class StagePipeline:
+    def __init__(
+        self,
+        stages: Iterable[Stage],
+        config: Any,
+        cache_dir: Optional[Path] = None,
+        keep: int = 3,
+        profiler: Optional[PipelineProfiler] = None,
+    ) -> None:
+        self.stages = {stage.name: stage for stage in stages}
+        self._check_graph()
+        self.config = config
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.keep = keep
+        self.profiler = profiler
+        # "cached" or "ran" for every stage evaluated so far.
+        self.status: Dict[str, str] = {}
+        self._keys: Dict[str, str] = {}
+        self._outputs: Dict[str, Any] = {}
+
+    def _check_graph(self) -> None:
+        done: set = set()
+
+        def visit(name: str, path: Tuple[str, ...]) -> None:
+            if name in path:
+                raise ValueError(f"Stage cycle: {' -> '.join(path + (name,))}")
+            if name in done:
+                return
+            if name not in self.stages:
+                raise ValueError(f"Stage {path[-1]} has unknown input: {name}")
+            for upstream in self.stages[name].inputs:
+                visit(upstream, path + (name,))
+            done.add(name)
+
+        for name in self.stages:
+            visit(name, ())
+
+    def key(self, name: str) -> str:
+        if name not in self._keys:
+            stage = self.stages[name]
+            if stage.fingerprint is not None:
+                payload = {"stage": name, "fingerprint": stage.fingerprint}
+            else:
+                payload = {
+                    "stage": name,
+                    "code": code_version(stage),
+                    "config": {f: getattr(self.config, f) for f in stage.config_fields},
+                    "params": stage.params,
+                    "inputs": {i: self.key(i) for i in stage.inputs},
+                }
+            self._keys[name] = _hash(payload)
+        return self._keys[name]
+
+    def _cache_path(self, stage: Stage) -> Optional[Path]:
+        if self.cache_dir is None or not stage.cache:
+            return None
+        return self.cache_dir / stage.name / f"{self.key(stage.name)}.joblib"
+
+    def get(self, name: str) -> Any:
+        if name in self._outputs:
+            return self._outputs[name]
+        stage = self.stages[name]
+        path = self._cache_path(stage)
+        if path is not None and path.exists():
+            with phase(self.profiler, f"{name}_cached"):
+                output = joblib.load(path)
+            os.utime(path)
+            self.status[name] = "cached"
+        else:
+            inputs = {i: self.get(i) for i in stage.inputs}
+            with phase(self.profiler, name) as record:
+                output = stage.func(**inputs)
+                if isinstance(output, pd.DataFrame):
+                    record["rows"] = len(output)
+            self.status[name] = "ran"
+            if path is not None:
+                self._store(path, output)
+        self._outputs[name] = output
+        return output
+
+    def run(self, targets: Iterable[str]) -> Dict[str, Any]:
+        return {name: self.get(name) for name in targets}
+
+    def _store(self, path: Path, output: Any) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A tmp file of its own: concurrent jobs of one tenant may store the
+        # same key at once, and each must replace the entry with a whole file.
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, prefix=path.name, suffix=".tmp", delete=False
+        ) as tmp:
+            tmp_path = Path(tmp.name)
+        try:
+            joblib.dump(output, tmp_path)
+            tmp_path.replace(path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        # Entries accumulate per key; keep the most recently used few per stage.
+        entries = sorted(
+            path.parent.glob("*.joblib"), key=lambda p: p.stat().st_mtime, reverse=True
+        )
+        for stale in entries[self.keep:]:
+            stale.unlink(missing_ok=True)
@@ -1,11 +1,28 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable
+from typing import TYPE_CHECKING, Iterable, List, Optional
 
-import boto3
-from botocore.config import Config
+from columnar import EXCEL_SUFFIXES, columnar_sibling, excel_as_columnar
+
+if TYPE_CHECKING:
+    from boto3.s3.transfer import TransferConfig
+
+# Files larger than this are sent as multipart uploads of this part size
+# (B2 requires parts of at least 5 MB).
+UPLOAD_CHUNK_SIZE = 16 * 1024**2
+# Files uploaded at once, and concurrent parts per multipart file.
+UPLOAD_FILE_WORKERS = 8
+UPLOAD_PART_CONCURRENCY = 8
+UPLOAD_MAX_ATTEMPTS = 4
+# Sized for UPLOAD_FILE_WORKERS files with several parts in flight each.
+_MAX_POOL_CONNECTIONS = 32
 
 
 def _get_env(name: str) -> str | None:
@@ -20,13 +37,23 @@ def get_b2_client():
     region = _get_env("B2_REGION") or "us-east-005"
     if not (key_id and app_key and endpoint):
         return None
+    # boto3 is imported here, not at module level: it adds a noticeable delay
+    # to starting the API and the training pipeline.
+    import boto3
+    from botocore.config import Config
+
     return boto3.client(
         "s3",
         aws_access_key_id=key_id,
         aws_secret_access_key=app_key,
         region_name=region,
         endpoint_url=f"https://{endpoint}",
-        config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        config=Config(
+            signature_version="s3v4",
+            s3={"addressing_style": "path"},
+            max_pool_connections=_MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": 5, "mode": "adaptive"},
+        ),
     )
 
 
@@ -40,13 +67,112 @@ def parse_b2_url(url: str) -> tuple[str, str] | None:
     return bucket, key
 
 
-def upload_files(client, bucket: str, local_paths: Iterable[Path], prefix: str) -> None:
-    for path in local_paths:
-        key = f"{prefix}/{path.name}"
+@dataclass
+class UploadResult:
+    path: Path
+    key: str
+    ok: bool
+    bytes: int = 0
+    seconds: float = 0.0
+    attempts: int = 0
+    sha256: Optional[str] = None
+    error: Optional[str] = None
+
+
+def _file_digests(path: Path) -> tuple[str, str]:
+    md5 = hashlib.md5(usedforsecurity=False)
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            md5.update(block)
+            sha256.update(block)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
+def _verify_upload(client, bucket: str, key: str, size: int, md5: str, sha256: str) -> None:
+    head = client.head_object(Bucket=bucket, Key=key)
+    if head["ContentLength"] != size:
+        raise IOError(f"size mismatch: uploaded {head['ContentLength']} of {size} bytes")
+    if head.get("Metadata", {}).get("sha256") != sha256:
+        raise IOError("sha256 metadata mismatch")
+    etag = head.get("ETag", "").strip('"')
+    # Single-part ETags are the MD5 of the content; multipart ETags are not.
+    if etag and "-" not in etag and etag != md5:
+        raise IOError(f"checksum mismatch: ETag {etag}, local MD5 {md5}")
+
+
+def _upload_one(
+    client,
+    bucket: str,
+    path: Path,
+    key: str,
+    transfer: TransferConfig,
+    max_attempts: int,
+) -> UploadResult:
+    result = UploadResult(path=path, key=key, ok=False)
+    start = time.perf_counter()
+    try:
+        result.bytes = path.stat().st_size
+        md5, result.sha256 = _file_digests(path)
+    except OSError as exc:
+        result.error = str(exc)
+        return result
+    for attempt in range(1, max_attempts + 1):
+        result.attempts = attempt
         try:
-            client.upload_file(str(path), bucket, key)
-        except Exception as exc:  # pragma: no cover
-            print(f"B2 upload failed for {path.name}: {exc}")
+            client.upload_file(
+                str(path),
+                bucket,
+                key,
+                ExtraArgs={"Metadata": {"sha256": result.sha256}},
+                Config=transfer,
+            )
+            _verify_upload(client, bucket, key, result.bytes, md5, result.sha256)
+            result.ok = True
+            result.error = None
+            break
+        except Exception as exc:
+            result.error = str(exc)
+            if attempt < max_attempts:
+                # Exponential backoff with jitter so parallel retries spread out.
+                time.sleep(min(30.0, 2 ** (attempt - 1)) * (0.5 + random.random()))
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def upload_files(
+    client,
+    bucket: str,
+    local_paths: Iterable[Path],
+    prefix: str,
+    max_workers: int = UPLOAD_FILE_WORKERS,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    part_concurrency: int = UPLOAD_PART_CONCURRENCY,
+    max_attempts: int = UPLOAD_MAX_ATTEMPTS,
+) -> List[UploadResult]:
+    # Files upload concurrently and large files as concurrent multipart parts,
+    # so the total time approaches that of the largest file. Each upload is
+    # checked against the local size and checksums and retried with backoff.
+    paths = [Path(path) for path in local_paths]
+    if not paths:
+        return []
+    from boto3.s3.transfer import TransferConfig
+
+    transfer = TransferConfig(
+        multipart_threshold=chunk_size,
+        multipart_chunksize=chunk_size,
+        max_concurrency=part_concurrency,
+        use_threads=True,
+    )
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(paths)))) as executor:
+        return list(
+            executor.map(
+                lambda path: _upload_one(
+                    client, bucket, path, f"{prefix}/{path.name}", transfer, max_attempts
+                ),
+                paths,
+            )
+        )
 
 
 def download_file(client, bucket: str, key: str, dest: Path) -> None:
@@ -54,6 +180,24 @@ def download_file(client, bucket: str, key: str, dest: Path) -> None:
     client.download_file(bucket, key, str(dest))
 
 
+def download_dataset(client, bucket: str, key: str, dest: Path) -> None:
+    download_file(client, bucket, key, dest)
+    if dest.suffix.lower() in EXCEL_SUFFIXES:
+        # Excel uploads may have a pre-converted columnar copy next to them.
+        try:
+            download_file(client, bucket, columnar_sibling(key), Path(columnar_sibling(str(dest))))
+        except Exception:  # pragma: no cover
+            pass
+
+
+def upload_dataset_columnar(client, bucket: str, key: str, local_path: Path) -> None:
+    if local_path.suffix.lower() not in EXCEL_SUFFIXES:
+        return
+    columnar_path = excel_as_columnar(local_path)
+    if columnar_path is not None:
+        client.upload_file(str(columnar_path), bucket, columnar_sibling(key))
+
+
 def presign_download_url(client, bucket: str, key: str, expires_in: int = 3600) -> str:
     return client.generate_presigned_url(
         "get_object",
@@ -3,26 +3,44 @@ from __future__ import annotations
 import json
 import os
 import uuid
+from functools import partial
 from pathlib import Path
 import argparse
-import yaml
+import importlib
 
-import mlflow
 import numpy as np
 import pandas as pd
-from dotenv import load_dotenv
 
 from config import get_config, get_paths
-from data_pipeline import clean_transactions, load_raw_transactions, standardize_columns
-from storage import get_b2_client, upload_files, download_file, parse_b2_url
-from features import build_rfm_features, build_time_split_features
+from columnar import COLUMNAR_SUFFIX, read_columnar
+from data_pipeline import clean_cache_path, load_clean_transactions, write_clean_cache
+from storage import get_b2_client, upload_files, download_dataset, download_file, parse_b2_url
+from feature_store import write_feature_store
+from features import (
+    build_feature_tables,
+    build_rolling_time_split_features,
+    build_time_split_features,
+)
+from resources import apply_thread_budget, resolve_thread_budget
+from profiling import PipelineProfiler, phase
+from rfm_state import RFMState
+from sql_features import SQLFeatureEngine, columnar_bytes, select_feature_backend
+from stage_cache import Stage, StagePipeline
+from transaction_store import TransactionStore
 from modeling import (
     ModelArtifacts,
     compute_business_cost,
+    evaluate_churn_models,
+    evaluate_ltv_model,
+    load_artifacts,
+    quality_degraded,
     save_artifacts,
     train_churn_models,
     train_ltv_model,
     train_segmentation,
+    update_churn_models,
+    update_ltv_model,
+    update_segmentation,
 )
 from reporting import build_segment_summary, recommend_actions, write_strategic_report
 from firestore_client import (
@@ -35,15 +53,48 @@ from firestore_client import (
 from notifications import build_training_complete_email
 from email_queue_client import enqueue_email_via_frontend
 
+# Imported when first needed rather than at module level, so `--help`, the API
+# and training workers start without paying for them; see warm_imports.
+_DEFERRED_IMPORTS = ("mlflow", "xgboost", "duckdb", "boto3", "firebase_admin.firestore", "yaml")
+
+
+def warm_imports() -> None:
+    # Loads the deferred dependencies ahead of the first job, for long-lived
+    # training workers. Missing optional ones are left to fail where used.
+    for name in _DEFERRED_IMPORTS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
 
 def _load_mapping(mapping_path: Path) -> dict:
     if mapping_path.suffix.lower() in {".yaml", ".yml"}:
+        import yaml
+
         with open(mapping_path, "r", encoding="utf-8") as f:
             return yaml.safe_load(f)
     with open(mapping_path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
+def _rolling_cutoff_dates(cutoff_date: pd.Timestamp, count: int, step_days: int) -> list:
+    return [cutoff_date - pd.Timedelta(days=step_days * i) for i in range(count)]
+
+
+def _load_json(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_json(path: Path, payload: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+
+
 def _resolve_b2_input(url: str, tenant_id: str, label: str) -> Path:
     parsed = parse_b2_url(url)
     if not parsed:
@@ -55,11 +106,225 @@ def _resolve_b2_input(url: str, tenant_id: str, label: str) -> Path:
     cache_dir = Path(__file__).resolve().parents[1] / "artifacts_cache" / tenant_id / "inputs"
     cache_dir.mkdir(parents=True, exist_ok=True)
     local_path = cache_dir / Path(key).name
-    download_file(client, bucket, key, local_path)
+    if label == "dataset":
+        download_dataset(client, bucket, key, local_path)
+    else:
+        download_file(client, bucket, key, local_path)
     return local_path
 
 
-def main() -> None:
+def _load_transactions(
+    data_file: str,
+    mapping: dict | None,
+    cache_dir: Path | None,
+    chunksize: int | None,
+    dedup_keys: tuple | None,
+    profile_path: Path,
+    stats: dict,
+    profiler: PipelineProfiler | None = None,
+) -> pd.DataFrame:
+    df = load_clean_transactions(
+        data_file,
+        mapping,
+        cache_dir=cache_dir,
+        chunksize=chunksize,
+        datetime_format=_datetime_format(mapping, profile_path),
+        stats=stats,
+        dedup_keys=dedup_keys,
+        profiler=profiler,
+    )
+    _record_datetime_format(profile_path, stats)
+    return df
+
+
+def _stream_clean_cache(
+    data_file: str,
+    mapping: dict | None,
+    cache_path: Path,
+    chunksize: int | None,
+    dedup_keys: tuple | None,
+    profile_path: Path,
+    stats: dict,
+    profiler: PipelineProfiler | None = None,
+) -> None:
+    # Cleans the dataset into its columnar cache chunk by chunk, without ever
+    # holding the whole dataset in pandas.
+    with phase(profiler, "load_clean") as record:
+        record["rows"] = write_clean_cache(
+            data_file,
+            cache_path,
+            mapping,
+            chunksize=chunksize,
+            datetime_format=_datetime_format(mapping, profile_path),
+            stats=stats,
+            dedup_keys=dedup_keys,
+        )
+    _record_datetime_format(profile_path, stats)
+
+
+def _datetime_format(mapping: dict | None, profile_path: Path) -> str | None:
+    return (mapping or {}).get("order_datetime_format") or _load_json(profile_path).get("datetime_format")
+
+
+def _record_datetime_format(profile_path: Path, stats: dict) -> None:
+    profile = _load_json(profile_path)
+    detected_format = stats.get("datetime_format")
+    if detected_format and detected_format != profile.get("datetime_format"):
+        profile["datetime_format"] = detected_format
+        _save_json(profile_path, profile)
+    if stats:
+        print(
+            f"InvoiceDate format: {detected_format or 'mixed'} "
+            f"({stats.get('datetime_fallback_rows', 0)} rows needed fallback parsing)"
+        )
+
+
+def _features_stage(
+    transactions,
+    config,
+    backend: str,
+    rolling_cutoffs: int,
+    rfm_state: RFMState | None,
+    n_workers: int,
+    n_threads: int,
+    temp_dir: Path,
+    profiler: PipelineProfiler | None = None,
+) -> dict:
+    # `transactions` is the cleaned DataFrame, or its columnar files for DuckDB.
+    training_df = None
+    if backend == "duckdb":
+        print(f"Building features with DuckDB from {columnar_bytes(transactions)} bytes of cleaned data")
+        with SQLFeatureEngine(
+            transactions,
+            temp_dir=temp_dir,
+            memory_limit=config.sql_memory_limit,
+            threads=n_threads,
+        ) as engine:
+            max_date = engine.max_invoice_date()
+            snapshot_date = max_date + pd.Timedelta(days=1)
+            cutoff_date = max_date - pd.Timedelta(days=config.holdout_days)
+            with phase(profiler, "rfm") as record:
+                rfm = (
+                    rfm_state.to_rfm(snapshot_date)
+                    if rfm_state is not None
+                    else engine.rfm_features(snapshot_date)
+                )
+                record["rows"] = len(rfm)
+            with phase(profiler, "time_split") as record:
+                modeling_df = engine.time_split_features(
+                    cutoff_date, config.churn_window_days, config.ltv_horizon_days
+                )
+                record["rows"] = len(modeling_df)
+            if rolling_cutoffs > 1:
+                with phase(profiler, "rolling_time_split") as record:
+                    training_df = engine.rolling_time_split_features(
+                        _rolling_cutoff_dates(cutoff_date, rolling_cutoffs, config.rolling_step_days),
+                        config.churn_window_days,
+                        config.ltv_horizon_days,
+                    )
+                    record["rows"] = len(training_df)
+    else:
+        df = transactions
+        snapshot_date = df["InvoiceDate"].max() + pd.Timedelta(days=1)
+        cutoff_date = df["InvoiceDate"].max() - pd.Timedelta(days=config.holdout_days)
+        if rfm_state is not None:
+            with phase(profiler, "rfm") as record:
+                rfm = rfm_state.to_rfm(snapshot_date)
+                record["rows"] = len(rfm)
+            with phase(profiler, "time_split") as record:
+                modeling_df = build_time_split_features(
+                    df,
+                    cutoff_date=cutoff_date,
+                    churn_window_days=config.churn_window_days,
+                    ltv_horizon_days=config.ltv_horizon_days,
+                    n_workers=n_workers,
+                )
+                record["rows"] = len(modeling_df)
+        else:
+            # Both tables come from one pass over the transactions.
+            with phase(profiler, "rfm_time_split") as record:
+                rfm, modeling_df = build_feature_tables(
+                    df,
+                    snapshot_date=snapshot_date,
+                    cutoff_date=cutoff_date,
+                    churn_window_days=config.churn_window_days,
+                    ltv_horizon_days=config.ltv_horizon_days,
+                    n_workers=n_workers,
+                )
+                record["rows"] = len(modeling_df)
+        if rolling_cutoffs > 1:
+            with phase(profiler, "rolling_time_split") as record:
+                training_df = build_rolling_time_split_features(
+                    df,
+                    cutoff_dates=_rolling_cutoff_dates(cutoff_date, rolling_cutoffs, config.rolling_step_days),
+                    churn_window_days=config.churn_window_days,
+                    ltv_horizon_days=config.ltv_horizon_days,
+                    n_workers=n_workers,
+                )
+                record["rows"] = len(training_df)
+
+    modeling_df = modeling_df[modeling_df["frequency"] >= config.min_transactions].copy()
+    if training_df is None:
+        training_df = modeling_df
+    else:
+        training_df = training_df[training_df["frequency"] >= config.min_transactions].copy()
+    return {"rfm": rfm, "modeling": modeling_df, "training": training_df}
+
+
+def _segmentation_stage(
+    features: dict, config, n_threads: int, profiler: PipelineProfiler | None = None
+) -> tuple:
+    return train_segmentation(
+        features["rfm"],
+        config.random_state,
+        config.k_range,
+        criterion=config.k_criterion,
+        sample_size=config.k_sample_size,
+        minibatch_threshold=config.kmeans_minibatch_threshold,
+        n_workers=config.k_workers,
+        n_threads=n_threads,
+        profiler=profiler,
+    )
+
+
+def _churn_stage(
+    features: dict, config, n_threads: int, profiler: PipelineProfiler | None = None
+) -> tuple:
+    search_log: dict = {}
+    churn_logreg, churn_xgb, churn_metrics = train_churn_models(
+        features["training"],
+        config.random_state,
+        threshold_objective=config.threshold_objective,
+        cost_fp=config.cost_fp,
+        cost_fn=config.cost_fn,
+        n_threads=n_threads,
+        max_estimators=config.xgb_max_estimators,
+        n_candidates=config.xgb_search_candidates,
+        search_log=search_log,
+        profiler=profiler,
+    )
+    return churn_logreg, churn_xgb, churn_metrics, search_log
+
+
+def _ltv_stage(
+    features: dict, config, n_threads: int, profiler: PipelineProfiler | None = None
+) -> tuple:
+    search_log: dict = {}
+    ltv_xgb, ltv_metrics = train_ltv_model(
+        features["training"],
+        config.random_state,
+        n_threads=n_threads,
+        max_estimators=config.xgb_max_estimators,
+        n_candidates=config.xgb_search_candidates,
+        search_log=search_log,
+        profiler=profiler,
+    )
+    return ltv_xgb, ltv_metrics, search_log
+
+
+def main(argv: list[str] | None = None) -> None:
+    from dotenv import load_dotenv
+
     load_dotenv()
     parser = argparse.ArgumentParser(description="Train segmentation and churn models.")
     parser.add_argument("--data-path", type=str, default=None)
@@ -67,7 +332,44 @@ def main() -> None:
     parser.add_argument("--tenant-id", type=str, default="local")
     parser.add_argument("--notify-email", type=str, default=None)
     parser.add_argument("--queue-id", type=str, default=None)
-    args = parser.parse_args()
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Read and clean the dataset in chunks of this many rows.",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Re-parse the dataset and rerun every stage instead of reusing cached results.",
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Treat the dataset as a delta and append it to the tenant's stored transactions.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Continue from the tenant's previous models instead of retraining from scratch.",
+    )
+    parser.add_argument(
+        "--rolling-cutoffs",
+        type=int,
+        default=None,
+        help="Train churn/LTV models on this many historical cutoffs stacked together.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="CPU threads this job may use across BLAS/OpenMP, DuckDB and model fits.",
+    )
+    args = parser.parse_args(argv)
+    import mlflow
+
+    # Wall/CPU time, peak RSS and rows per phase, logged with the MLflow run.
+    profiler = PipelineProfiler()
 
     try:
         paths = get_paths()
@@ -97,6 +399,9 @@ def main() -> None:
                         pass
             mlflow.set_tracking_uri(f"file:{tracking_dir}")
         config = get_config()
+        n_threads = resolve_thread_budget(args.threads or config.n_threads)
+        apply_thread_budget(n_threads)
+        feature_workers = min(config.feature_workers, n_threads)
         if not os.getenv("MLFLOW_TRACKING_URI"):
             tracking_db = paths.root / "mlflow.db"
             mlflow.set_tracking_uri(f"sqlite:///{tracking_db}")
@@ -113,7 +418,7 @@ def main() -> None:
             if parse_b2_url(args.data_path):
                 dataset_path_for_metadata = args.data_path
             data_file = _resolve_b2_input(args.data_path, args.tenant_id, "dataset")
-        df_raw = load_raw_transactions(str(data_file))
+        mapping = None
         if args.mapping_path:
             if parse_b2_url(args.mapping_path):
                 mapping_path_for_metadata = args.mapping_path
@@ -121,21 +426,178 @@ def main() -> None:
                 mapping_path_for_metadata = str(Path(args.mapping_path))
             mapping_path = _resolve_b2_input(args.mapping_path, args.tenant_id, "mapping")
             mapping = _load_mapping(mapping_path)
-            df_raw = standardize_columns(df_raw, mapping)
-        df = clean_transactions(df_raw)
+        cache_dir = None
+        if config.cache_cleaned and not args.no_cache:
+            cache_dir = paths.root / "artifacts_cache" / args.tenant_id / "cleaned"
+        ingest_stats: dict = {}
+        load_transactions = partial(
+            _load_transactions,
+            str(data_file),
+            mapping,
+            cache_dir=cache_dir,
+            chunksize=args.chunk_size or config.ingest_chunksize,
+            dedup_keys=config.dedup_keys,
+            profile_path=paths.root / "artifacts_cache" / args.tenant_id / "profile.json",
+            stats=ingest_stats,
+            profiler=profiler,
+        )
+        # Cleaned columnar files behind the transactions. When they are large
+        # enough, features are built by DuckDB straight from the files and the
+        # transactions are never loaded into pandas.
+        sources: list = []
+        scratch_path: Path | None = None
+        # Identifies the cleaned transactions without loading them, so cached
+        # stages can be reused; None disables the stage cache.
+        data_fingerprint = None
+        rfm_state = None
+        new_rows = None
+        if args.append:
+            store = TransactionStore(
+                paths.root / "artifacts_cache" / args.tenant_id / "transactions",
+                dedup_keys=config.dedup_keys,
+            )
+            previous_parts = store.parts()
+            new_rows = store.append(load_transactions())
+            watermark = store.watermark()
+            print(
+                f"Appended {len(new_rows)} new rows "
+                f"({watermark['rows']} stored, watermark {watermark['max_invoice_date']})"
+            )
+            sources = store.part_paths()
+            data_fingerprint = store.fingerprint()
+            load_transactions = store.load
 
-        snapshot_date = df["InvoiceDate"].max() + pd.Timedelta(days=1)
-        rfm = build_rfm_features(df, snapshot_date)
+            # Per-customer aggregates are updated with the delta only, unless the
+            # saved state is out of step with the stored parts.
+            rfm_state_dir = paths.root / "artifacts_cache" / args.tenant_id / "rfm_state"
+            rfm_state = RFMState.load(rfm_state_dir)
+            if rfm_state is not None and rfm_state.source_parts == previous_parts:
+                rfm_state.update(new_rows)
+            else:
+                # Parts hold disjoint rows, so they can be folded in one at a time.
+                rfm_state = RFMState()
+                for part in store.parts():
+                    rfm_state.update(store.load([part]))
+            rfm_state.source_parts = store.parts()
+            rfm_state.save(rfm_state_dir)
+        else:
+            # A raw file already past the SQL threshold is cleaned straight into
+            # a columnar file, so the backend can be chosen without loading the
+            # dataset into pandas. Without the clean cache the file is scratch
+            # space named for this run, deleted once the features are built.
+            stream = data_file.stat().st_size >= config.sql_backend_min_bytes
+            if cache_dir is not None:
+                cache_path = clean_cache_path(str(data_file), cache_dir, mapping, config.dedup_keys)
+                data_fingerprint = cache_path.stem
+                stream = stream and not cache_path.exists()
+            else:
+                scratch_dir = paths.root / "artifacts_cache" / args.tenant_id / "duckdb_tmp"
+                cache_path = scratch_dir / f"clean-{uuid.uuid4().hex}{COLUMNAR_SUFFIX}"
+            if stream:
+                _stream_clean_cache(
+                    str(data_file),
+                    mapping,
+                    cache_path,
+                    chunksize=args.chunk_size or config.ingest_chunksize,
+                    dedup_keys=config.dedup_keys,
+                    profile_path=paths.root / "artifacts_cache" / args.tenant_id / "profile.json",
+                    stats=ingest_stats,
+                    profiler=profiler,
+                )
+                load_transactions = partial(read_columnar, cache_path)
+                if cache_dir is None:
+                    scratch_path = cache_path
+            if stream or (cache_dir is not None and cache_path.exists()):
+                sources = [cache_path]
+        backend = select_feature_backend(sources, config.sql_backend_min_bytes)
 
-        cutoff_date = df["InvoiceDate"].max() - pd.Timedelta(days=config.holdout_days)
-        modeling_df = build_time_split_features(
-            df,
-            cutoff_date=cutoff_date,
-            churn_window_days=config.churn_window_days,
-            ltv_horizon_days=config.ltv_horizon_days,
+        # Each stage's output is cached under a hash of its code, the Config
+        # fields it reads and its inputs' keys, so a retrain that only changes
+        # e.g. k_range reuses the features and churn/LTV models.
+        rolling_cutoffs = args.rolling_cutoffs or config.rolling_cutoffs
+        stage_dir = None
+        if config.cache_stages and not args.no_cache and data_fingerprint:
+            stage_dir = paths.root / "artifacts_cache" / args.tenant_id / "stages"
+        pipeline = StagePipeline(
+            [
+                Stage(
+                    "transactions",
+                    (lambda: sources) if backend == "duckdb" else load_transactions,
+                    fingerprint=data_fingerprint,
+                    cache=False,
+                ),
+                Stage(
+                    "features",
+                    partial(
+                        _features_stage,
+                        config=config,
+                        backend=backend,
+                        rolling_cutoffs=rolling_cutoffs,
+                        rfm_state=rfm_state,
+                        n_workers=feature_workers,
+                        n_threads=n_threads,
+                        temp_dir=paths.root / "artifacts_cache" / args.tenant_id / "duckdb_tmp",
+                        profiler=profiler,
+                    ),
+                    inputs=("transactions",),
+                    config_fields=(
+                        "churn_window_days",
+                        "ltv_horizon_days",
+                        "holdout_days",
+                        "min_transactions",
+                        "rolling_step_days",
+                    ),
+                    params={"rolling_cutoffs": rolling_cutoffs},
+                    modules=("features", "sql_features"),
+                ),
+                Stage(
+                    "segmentation",
+                    partial(_segmentation_stage, config=config, n_threads=n_threads, profiler=profiler),
+                    inputs=("features",),
+                    config_fields=(
+                        "random_state",
+                        "k_range",
+                        "k_criterion",
+                        "k_sample_size",
+                        "kmeans_minibatch_threshold",
+                    ),
+                    modules=("modeling",),
+                ),
+                Stage(
+                    "churn",
+                    partial(_churn_stage, config=config, n_threads=n_threads, profiler=profiler),
+                    inputs=("features",),
+                    config_fields=(
+                        "random_state",
+                        "threshold_objective",
+                        "cost_fp",
+                        "cost_fn",
+                        "xgb_max_estimators",
+                        "xgb_search_candidates",
+                    ),
+                    modules=("modeling", "model_search"),
+                ),
+                Stage(
+                    "ltv",
+                    partial(_ltv_stage, config=config, n_threads=n_threads, profiler=profiler),
+                    inputs=("features",),
+                    config_fields=("random_state", "xgb_max_estimators", "xgb_search_candidates"),
+                    modules=("modeling", "model_search"),
+                ),
+            ],
+            config,
+            cache_dir=stage_dir,
+            keep=config.stage_cache_keep,
+            profiler=profiler,
         )
-
-        modeling_df = modeling_df[modeling_df["frequency"] >= config.min_transactions].copy()
+        try:
+            features = pipeline.get("features")
+        finally:
+            if scratch_path is not None:
+                scratch_path.unlink(missing_ok=True)
+        rfm = features["rfm"]
+        modeling_df = features["modeling"]
+        training_df = features["training"]
 
         run_id = str(uuid.uuid4())
         mlflow.set_experiment(config.mlflow_experiment)
@@ -146,21 +608,110 @@ def main() -> None:
                     "ltv_horizon_days": config.ltv_horizon_days,
                     "holdout_days": config.holdout_days,
                     "min_transactions": config.min_transactions,
+                    "rolling_cutoffs": rolling_cutoffs,
+                    "feature_backend": backend,
+                    "k_criterion": config.k_criterion,
+                    "threshold_objective": config.threshold_objective,
+                    "xgb_search_candidates": config.xgb_search_candidates,
+                    "threads": n_threads,
                 }
             )
+            if ingest_stats:
+                mlflow.log_metric(
+                    "datetime_fallback_rows", ingest_stats.get("datetime_fallback_rows", 0)
+                )
 
-            scaler, kmeans, segmented_df, k_scores = train_segmentation(
-                rfm, config.random_state, config.k_range
-            )
-            segmented_df.to_csv(paths.artifacts / "segmented_customers.csv", index=False)
+            # Incremental mode continues from the tenant's previous models and
+            # falls back to a full retrain when quality drops below the last
+            # full retrain or after warm_start_max_runs updates in a row. The
+            # last full retrain's models are kept under reference/ and scored
+            # on this run's holdout, so both sides of the check share test rows
+            # and drift in the data does not count as degradation.
+            warm_dir = paths.root / "artifacts_cache" / args.tenant_id / "warm_start"
+            reference_dir = warm_dir / "reference"
+            warm_state = _load_json(warm_dir / "state.json")
+            training_mode = "full"
+            if (
+                (args.incremental or config.warm_start)
+                and warm_state
+                and warm_state["incremental_runs"] < config.warm_start_max_runs
+            ):
+                previous = load_artifacts(str(warm_dir))
+                update_rows = None
+                if args.append:
+                    update_rows = training_df["CustomerID"].isin(new_rows["CustomerID"]).to_numpy()
+                with phase(profiler, "update_segmentation"):
+                    scaler, kmeans, segmented_df, k_scores = update_segmentation(
+                        rfm,
+                        previous.scaler,
+                        previous.kmeans,
+                        config.random_state,
+                        criterion=config.k_criterion,
+                        sample_size=config.k_sample_size,
+                    )
+                with phase(profiler, "update_churn"):
+                    churn_logreg, churn_xgb, churn_metrics = update_churn_models(
+                        training_df,
+                        previous.churn_logreg,
+                        previous.churn_xgb,
+                        config.random_state,
+                        threshold_objective=config.threshold_objective,
+                        cost_fp=config.cost_fp,
+                        cost_fn=config.cost_fn,
+                        update_rows=update_rows,
+                        n_threads=n_threads,
+                    )
+                with phase(profiler, "update_ltv"):
+                    ltv_xgb, ltv_metrics = update_ltv_model(
+                        training_df,
+                        previous.ltv_xgb,
+                        config.random_state,
+                        update_rows=update_rows,
+                        n_threads=n_threads,
+                    )
+                # Warm states saved before reference/ existed only have the
+                # metrics recorded at their full retrain.
+                reference_metrics = warm_state["reference_metrics"]
+                if (reference_dir / "ltv_xgb.joblib").exists():
+                    reference = load_artifacts(str(reference_dir))
+                    with phase(profiler, "score_reference"):
+                        reference_metrics = {
+                            **evaluate_churn_models(
+                                training_df,
+                                reference.churn_logreg,
+                                reference.churn_xgb,
+                                config.random_state,
+                                threshold_objective=config.threshold_objective,
+                                cost_fp=config.cost_fp,
+                                cost_fn=config.cost_fn,
+                            ),
+                            **evaluate_ltv_model(training_df, reference.ltv_xgb, config.random_state),
+                        }
+                degraded = quality_degraded(
+                    {**churn_metrics, **ltv_metrics},
+                    reference_metrics,
+                    config.warm_start_auc_tolerance,
+                    config.warm_start_rmse_tolerance,
+                )
+                if degraded:
+                    print(f"Incremental models degraded ({'; '.join(degraded)}); retraining from scratch")
+                else:
+                    training_mode = "incremental"
 
-            churn_logreg, churn_xgb, churn_metrics = train_churn_models(
-                modeling_df, config.random_state
-            )
+            if training_mode == "full":
+                scaler, kmeans, segmented_df, k_scores = pipeline.get("segmentation")
+                churn_logreg, churn_xgb, churn_metrics, churn_search = pipeline.get("churn")
+                ltv_xgb, ltv_metrics, ltv_search = pipeline.get("ltv")
+                for name, search in {**churn_search, **ltv_search}.items():
+                    mlflow.log_params({f"{name}_{key}": value for key, value in search["params"].items()})
+                    mlflow.log_metric(f"{name}_search_seconds", search["seconds"])
+                    mlflow.log_dict(search, f"search/{name}.json")
+            print("Stages:", ", ".join(f"{name} {status}" for name, status in pipeline.status.items()))
+            mlflow.log_params({f"stage_{name}": status for name, status in pipeline.status.items()})
+            mlflow.log_param("training_mode", training_mode)
             mlflow.log_metrics(churn_metrics)
-
-            ltv_xgb, ltv_metrics = train_ltv_model(modeling_df, config.random_state)
             mlflow.log_metrics(ltv_metrics)
+            segmented_df.to_csv(paths.artifacts / "segmented_customers.csv", index=False)
 
             y_true = modeling_df["churn_label"].values
             churn_probs = churn_xgb.predict_proba(
@@ -176,17 +727,38 @@ def main() -> None:
                     ]
                 ]
             )[:, 1]
-            business_cost = compute_business_cost(y_true, churn_probs, cost_fp=5.0, cost_fn=20.0)
+            business_cost = compute_business_cost(
+                y_true, churn_probs, cost_fp=config.cost_fp, cost_fn=config.cost_fn
+            )
             mlflow.log_metric("business_cost", business_cost)
 
-            artifacts = ModelArtifacts(
-                scaler=scaler,
-                kmeans=kmeans,
-                churn_logreg=churn_logreg,
-                churn_xgb=churn_xgb,
-                ltv_xgb=ltv_xgb,
-            )
-            save_artifacts(str(paths.artifacts), artifacts)
+            with phase(profiler, "save_artifacts"):
+                artifacts = ModelArtifacts(
+                    scaler=scaler,
+                    kmeans=kmeans,
+                    churn_logreg=churn_logreg,
+                    churn_xgb=churn_xgb,
+                    ltv_xgb=ltv_xgb,
+                )
+                save_artifacts(str(paths.artifacts), artifacts)
+                warm_dir.mkdir(parents=True, exist_ok=True)
+                save_artifacts(str(warm_dir), artifacts)
+                if training_mode == "full":
+                    reference_dir.mkdir(exist_ok=True)
+                    save_artifacts(str(reference_dir), artifacts)
+                _save_json(
+                    warm_dir / "state.json",
+                    {
+                        "reference_metrics": (
+                            {**churn_metrics, **ltv_metrics}
+                            if training_mode == "full"
+                            else warm_state["reference_metrics"]
+                        ),
+                        "incremental_runs": (
+                            0 if training_mode == "full" else warm_state["incremental_runs"] + 1
+                        ),
+                    },
+                )
             # Save the best churn model by accuracy for API use
             best_model_name = (
                 "churn_logreg.joblib"
@@ -196,21 +768,23 @@ def main() -> None:
             best_model_path = paths.artifacts / best_model_name
             (paths.artifacts / "churn_best.joblib").write_bytes(best_model_path.read_bytes())
 
-            modeling_df.to_csv(paths.artifacts / "feature_store.csv", index=False)
+            with phase(profiler, "feature_store", rows=len(modeling_df)):
+                feature_store_file = write_feature_store(modeling_df, paths.artifacts)
 
-            segment_summary = build_segment_summary(
-                segmented_df.merge(
-                    modeling_df[["CustomerID", "churn_label", "future_spend"]],
-                    on="CustomerID",
-                    how="left",
-                ).fillna({"churn_label": 0, "future_spend": 0.0})
-            )
-            segment_summary = recommend_actions(segment_summary)
-            segment_summary.to_csv(paths.artifacts / "segment_summary.csv", index=False)
-            write_strategic_report(segment_summary, str(paths.reports / "strategic_report.md"))
+            with phase(profiler, "reports"):
+                segment_summary = build_segment_summary(
+                    segmented_df.merge(
+                        modeling_df[["CustomerID", "churn_label", "future_spend"]],
+                        on="CustomerID",
+                        how="left",
+                    ).fillna({"churn_label": 0, "future_spend": 0.0})
+                )
+                segment_summary = recommend_actions(segment_summary)
+                segment_summary.to_csv(paths.artifacts / "segment_summary.csv", index=False)
+                write_strategic_report(segment_summary, str(paths.reports / "strategic_report.md"))
 
-            with open(paths.artifacts / "kmeans_scores.json", "w", encoding="utf-8") as f:
-                json.dump(k_scores, f, indent=2)
+                with open(paths.artifacts / "kmeans_scores.json", "w", encoding="utf-8") as f:
+                    json.dump(k_scores, f, indent=2)
 
             mlflow.log_artifact(str(paths.reports / "strategic_report.md"))
             mlflow.log_artifact(str(paths.artifacts / "segment_summary.csv"))
@@ -231,36 +805,50 @@ def main() -> None:
                     paths.artifacts / "churn_best.joblib",
                     paths.artifacts / "ltv_xgb.joblib",
                     paths.artifacts / "segment_summary.csv",
-                    paths.artifacts / "feature_store.csv",
+                    feature_store_file,
                     paths.artifacts / "kmeans_scores.json",
                 ]
-                upload_files(client, b2_bucket, local_paths, prefix)
+                with phase(profiler, "b2_upload", rows=len(local_paths)):
+                    upload_results = upload_files(client, b2_bucket, local_paths, prefix)
+                for result in upload_results:
+                    if not result.ok:
+                        print(
+                            f"B2 upload failed for {result.path.name} "
+                            f"after {result.attempts} attempts: {result.error}"
+                        )
+                mlflow.log_metric("b2_upload_bytes", sum(result.bytes for result in upload_results))
+                mlflow.log_metric("b2_upload_failures", sum(not result.ok for result in upload_results))
                 artifact_prefix = f"b2://{b2_bucket}/{prefix}"
             else:
                 artifact_prefix = str(paths.artifacts)
 
             full_metrics = {**churn_metrics, **ltv_metrics, "business_cost": business_cost}
-            write_training_metadata(
-                tenant_id=args.tenant_id,
-                run_id=run_id,
-                metrics=full_metrics,
-                artifact_prefix=artifact_prefix,
-                dataset_path=dataset_path_for_metadata,
-                mapping_path=mapping_path_for_metadata if args.mapping_path else None,
-            )
-            model_name = f"{Path(data_file).name} ({run_id[:8]})"
-            write_model_registry(
-                tenant_id=args.tenant_id,
-                model_id=run_id,
-                name=model_name,
-                metrics=full_metrics,
-                artifact_prefix=artifact_prefix,
-            )
-            write_segment_summary(
-                tenant_id=args.tenant_id,
-                run_id=run_id,
-                summary_rows=segment_summary.to_dict(orient="records"),
-            )
+            with phase(profiler, "firestore"):
+                write_training_metadata(
+                    tenant_id=args.tenant_id,
+                    run_id=run_id,
+                    metrics=full_metrics,
+                    artifact_prefix=artifact_prefix,
+                    dataset_path=dataset_path_for_metadata,
+                    mapping_path=mapping_path_for_metadata if args.mapping_path else None,
+                )
+                model_name = f"{Path(data_file).name} ({run_id[:8]})"
+                write_model_registry(
+                    tenant_id=args.tenant_id,
+                    model_id=run_id,
+                    name=model_name,
+                    metrics=full_metrics,
+                    artifact_prefix=artifact_prefix,
+                )
+                write_segment_summary(
+                    tenant_id=args.tenant_id,
+                    run_id=run_id,
+                    summary_rows=segment_summary.to_dict(orient="records"),
+                )
+            profile_path = profiler.write(paths.artifacts / "pipeline_profile.json")
+            mlflow.log_metrics(profiler.metrics())
+            mlflow.log_artifact(str(profile_path))
+
             if args.queue_id:
                 update_queue_job(
                     args.tenant_id,
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+# Finished jobs kept for status lookups.
+_MAX_FINISHED_JOBS = 1000
+
+
+class PoolFull(Exception):
+    pass
+
+
+@dataclass
+class TrainingJob:
+    job_id: str
+    tenant_id: str
+    argv: List[str]
+    queue_id: Optional[str] = None
+    status: str = QUEUED
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_requested: bool = False
+
+    def to_dict(self) -> Dict:
+        payload = asdict(self)
+        payload.pop("argv")
+        payload.pop("cancel_requested")
+        return payload
+
+
+def _worker_main(conn) -> None:
+    # Imported once per worker, so jobs start with pandas/sklearn/xgboost/mlflow
+    # and the cloud clients already loaded.
+    import train_pipeline
+
+    train_pipeline.warm_imports()
+
+    while True:
+        try:
+            argv = conn.recv()
+        except EOFError:  # the API process went away
+            return
+        if argv is None:
+            return
+        try:
+            train_pipeline.main(argv)
+            conn.send((COMPLETED, None))
+        except BaseException as exc:  # argparse exits with SystemExit
+            traceback.print_exc()
+            conn.send((FAILED, f"{type(exc).__name__}: {exc}"))
+
+
+class _Worker:
+    def __init__(self, context) -> None:
+        self.conn, child_conn = context.Pipe()
+        # Not a daemon: training may start its own feature-building processes.
+        self.process = context.Process(target=_worker_main, args=(child_conn,))
+        self.process.start()
+        child_conn.close()
+        self.jobs_run = 0
+
+    def stop(self, timeout: float = 5.0) -> None:
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5.0)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        self.conn.close()
+
+
+# Long-lived training worker processes fed from a queue. Each slot is a
+# dispatcher thread owning one worker process; jobs run one per worker, so
+# `workers` caps concurrent trainings and `max_queued` caps waiting ones
+# (cancelled jobs still in the queue do not count).
+# Cancelling a running job terminates its worker, which is then replaced;
+# workers are also recycled after `max_jobs_per_worker` jobs so memory held by
+# earlier runs is returned. `on_finish` is called with each job once its final
+# status is set (by the dispatcher for jobs that ran, by cancel/shutdown for
+# jobs that never left the queue).
+class TrainingPool:
+    def __init__(
+        self,
+        workers: int = 1,
+        max_queued: int = 8,
+        max_jobs_per_worker: int = 20,
+        poll_seconds: float = 0.5,
+        on_finish: Optional[Callable[[TrainingJob], None]] = None,
+    ) -> None:
+        # Spawned rather than forked: the API process holds client threads and
+        # sockets that must not be copied into the workers.
+        self._context = multiprocessing.get_context("spawn")
+        self._queue: "queue.Queue[Optional[TrainingJob]]" = queue.Queue()
+        self._max_queued = max_queued
+        # Jobs waiting to run; cancelled ones are skipped when dequeued.
+        self._pending = 0
+        self._jobs: Dict[str, TrainingJob] = {}
+        self._lock = threading.Lock()
+        self._max_jobs_per_worker = max_jobs_per_worker
+        self._poll_seconds = poll_seconds
+        self._on_finish = on_finish
+        self._threads = [
+            threading.Thread(target=self._dispatch, name=f"training-slot-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, tenant_id: str, argv: List[str], queue_id: Optional[str] = None) -> TrainingJob:
+        job = TrainingJob(job_id=str(uuid.uuid4()), tenant_id=tenant_id, argv=list(argv), queue_id=queue_id)
+        with self._lock:
+            if self._pending >= self._max_queued:
+                raise PoolFull(f"Training queue is full ({self._max_queued} jobs waiting)")
+            self._pending += 1
+            self._jobs[job.job_id] = job
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, tenant_id: Optional[str] = None) -> List[TrainingJob]:
+        with self._lock:
+            return [job for job in self._jobs.values() if tenant_id is None or job.tenant_id == tenant_id]
+
+    def cancel(self, job_id: str) -> Optional[TrainingJob]:
+        # Queued jobs are skipped when dequeued; running ones are stopped by
+        # their dispatcher within poll_seconds.
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            job.cancel_requested = True
+            if job.status != QUEUED:
+                return job
+            self._pending -= 1
+            self._finish(job, CANCELLED)
+        self._notify(job)
+        return job
+
+    def shutdown(self) -> None:
+        # Waiting jobs are cancelled; running ones finish first.
+        with self._lock:
+            cancelled = [job for job in self._jobs.values() if job.status == QUEUED]
+            for job in cancelled:
+                job.cancel_requested = True
+                self._finish(job, CANCELLED)
+            self._pending = 0
+        for job in cancelled:
+            self._notify(job)
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _finish(self, job: TrainingJob, status: str, error: Optional[str] = None) -> None:
+        # Called with the lock held.
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        finished = [j for j in self._jobs.values() if j.status in FINISHED]
+        for old in sorted(finished, key=lambda j: j.finished_at)[: max(0, len(finished) - _MAX_FINISHED_JOBS)]:
+            del self._jobs[old.job_id]
+
+    def _notify(self, job: TrainingJob) -> None:
+        # Called without the lock; a failing callback must not stop the slot.
+        if self._on_finish is None:
+            return
+        try:
+            self._on_finish(job)
+        except Exception:
+            traceback.print_exc()
+
+    def _dispatch(self) -> None:
+        worker = _Worker(self._context)
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                with self._lock:
+                    if job.cancel_requested:
+                        continue
+                    self._pending -= 1
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                if not worker.process.is_alive() or worker.jobs_run >= self._max_jobs_per_worker:
+                    worker.stop()
+                    worker = _Worker(self._context)
+                worker = self._run(worker, job)
+                self._notify(job)
+        finally:
+            worker.stop()
+
+    def _run(self, worker: _Worker, job: TrainingJob) -> _Worker:
+        worker.jobs_run += 1
+        try:
+            worker.conn.send(job.argv)
+            while not worker.conn.poll(self._poll_seconds):
+                if job.cancel_requested or not worker.process.is_alive():
+                    break
+            if worker.conn.poll(0):
+                status, error = worker.conn.recv()
+                with self._lock:
+                    self._finish(job, status, error)
+                return worker
+        except (EOFError, BrokenPipeError, OSError):
+            pass
+        # Cancelled, or the worker died mid-job: replace it.
+        worker.kill()
+        with self._lock:
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+            else:
+                self._finish(job, FAILED, f"Training worker exited with code {worker.process.exitcode}")
+        return _Worker(self._context)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from columnar import COLUMNAR_SUFFIX, content_hash, read_columnar, write_columnar
+from data_pipeline import TRANSACTION_COLUMNS, RowHashSet, collect_clean_transactions, row_fingerprints
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock
+    fcntl = None
+
+
+# Append-only cleaned transactions for one tenant, stored as Arrow parts.
+# watermark.json lists the committed parts and the latest InvoiceDate ingested;
+# each part has a <part>.hashes.npy file with the fingerprints of its rows so
+# overlapping delta uploads only add rows that were not seen before. The seen
+# rows are rebuilt from the committed parts only, so files left behind by an
+# append that crashed before its watermark was written are ignored. Appends
+# hold an exclusive lock on <root>/.lock, so concurrent jobs of one tenant
+# neither pick the same part name nor dedup against a stale watermark.
+class TransactionStore:
+    def __init__(self, root: Path, dedup_keys: Optional[Sequence[str]] = None) -> None:
+        self.root = Path(root)
+        self.dedup_keys = list(dedup_keys) if dedup_keys else None
+        self._watermark_path = self.root / "watermark.json"
+
+    def watermark(self) -> Dict:
+        if not self._watermark_path.exists():
+            return {"parts": [], "rows": 0, "max_invoice_date": None}
+        with open(self._watermark_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _hashes_path(self, part_name: str) -> Path:
+        return self.root / "parts" / f"{Path(part_name).stem}.hashes.npy"
+
+    def _part_hashes(self, part_name: str) -> np.ndarray:
+        path = self._hashes_path(part_name)
+        if not path.exists():
+            # Stores written before per-part hashes: rebuild from the part itself.
+            part = read_columnar(self.root / "parts" / part_name)
+            self._save_hashes(path, row_fingerprints(part, self.dedup_keys))
+        return np.load(path)
+
+    def _save_hashes(self, path: Path, hashes: np.ndarray) -> None:
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, hashes)
+        tmp_path.replace(path)
+
+    def _seen(self, parts: Sequence[str]) -> RowHashSet:
+        if not parts:
+            return RowHashSet()
+        return RowHashSet(np.concatenate([self._part_hashes(name) for name in parts]))
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df[TRANSACTION_COLUMNS]
+        with self._locked():
+            return self._append(df)
+
+    def _append(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Called with the lock held.
+        watermark = self.watermark()
+        seen = self._seen(watermark["parts"])
+        hashes = row_fingerprints(df, self.dedup_keys)
+        keep = seen.add_new(hashes)
+        new_rows = df[keep].reset_index(drop=True)
+        if new_rows.empty:
+            return new_rows
+
+        part_name = f"part-{len(watermark['parts']) + 1:05d}{COLUMNAR_SUFFIX}"
+        write_columnar(new_rows, self.root / "parts" / part_name)
+        self._save_hashes(self._hashes_path(part_name), hashes[keep])
+
+        max_date = new_rows["InvoiceDate"].max()
+        late_rows = 0
+        if watermark["max_invoice_date"] is not None:
+            previous_max = pd.Timestamp(watermark["max_invoice_date"])
+            # Rows dated before the watermark are late arrivals, not duplicates.
+            late_rows = int((new_rows["InvoiceDate"] <= previous_max).sum())
+            max_date = max(max_date, previous_max)
+        watermark = {
+            "parts": watermark["parts"] + [part_name],
+            "rows": watermark["rows"] + len(new_rows),
+            "max_invoice_date": max_date.isoformat(),
+            "late_rows": late_rows,
+            "updated_at": datetime.now(tz=timezone.utc).isoformat(),
+        }
+        # The watermark is written last so a crash never exposes a half-written
+        # part or counts its rows as seen.
+        tmp_path = self._watermark_path.with_name(self._watermark_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(watermark, f, indent=2)
+        tmp_path.replace(self._watermark_path)
+        return new_rows
+
+    def parts(self) -> List[str]:
+        return list(self.watermark()["parts"])
+
+    def part_paths(self) -> List[Path]:
+        return [self.root / "parts" / name for name in self.parts()]
+
+    def fingerprint(self) -> Optional[str]:
+        # Identifies the stored rows: parts are immutable once committed, and the
+        # watermark changes with every append that adds rows.
+        if not self._watermark_path.exists():
+            return None
+        return content_hash(self._watermark_path, {"parts": self.parts()})
+
+    def load(self, parts: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        names = self.parts() if parts is None else list(parts)
+        return collect_clean_transactions(read_columnar(self.root / "parts" / name) for name in names)
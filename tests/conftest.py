@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The pipeline modules import each other as top-level modules from src/.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+def make_transactions(n_rows: int = 5000, n_customers: int = 300, seed: int = 0) -> pd.DataFrame:
+    # Cleaned transactions with the dtypes data_pipeline produces.
+    rng = np.random.default_rng(seed)
+    customers = rng.integers(10000, 10000 + n_customers, n_rows)
+    invoices = rng.integers(500000, 500000 + n_rows // 4, n_rows)
+    quantity = rng.integers(1, 20, n_rows).astype(np.int32)
+    price = np.round(rng.random(n_rows) * 10 + 0.1, 2).astype(np.float32)
+    dates = pd.Timestamp("2010-12-01") + pd.to_timedelta(rng.integers(0, 373 * 24 * 60, n_rows), unit="min")
+    df = pd.DataFrame(
+        {
+            "InvoiceNo": pd.Categorical(invoices.astype(str)),
+            "StockCode": pd.Categorical(rng.integers(20000, 20500, n_rows).astype(str)),
+            "Quantity": quantity,
+            "InvoiceDate": dates.as_unit("ns"),
+            "UnitPrice": price,
+            "CustomerID": pd.array(customers, dtype="Int64"),
+        }
+    )
+    df["TotalPrice"] = df["Quantity"].astype("float64") * df["UnitPrice"].astype("float64")
+    return df.sort_values("InvoiceDate", kind="stable", ignore_index=True)
+
+
+@pytest.fixture
+def transactions() -> pd.DataFrame:
+    return make_transactions()
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from features import build_rfm_features
+
+
+def _apply_rfm_features(df: pd.DataFrame, snapshot_date: pd.Timestamp) -> pd.DataFrame:
+    # Frozen copy of the row-wise implementation the vectorized one replaced.
+    rfm = (
+        df.groupby("CustomerID")
+        .agg(
+            recency_days=("InvoiceDate", lambda x: (snapshot_date - x.max()).days),
+            frequency=("InvoiceNo", "nunique"),
+            monetary=("TotalPrice", "sum"),
+            first_purchase=("InvoiceDate", "min"),
+            last_purchase=("InvoiceDate", "max"),
+            unique_products=("StockCode", "nunique"),
+            avg_basket_value=("TotalPrice", "mean"),
+            avg_quantity=("Quantity", "mean"),
+        )
+        .reset_index()
+    )
+
+    rfm["purchase_span_days"] = (rfm["last_purchase"] - rfm["first_purchase"]).dt.days
+    rfm["avg_interpurchase_days"] = rfm.apply(
+        lambda row: row["purchase_span_days"] / (row["frequency"] - 1)
+        if row["frequency"] > 1
+        else row["purchase_span_days"],
+        axis=1,
+    )
+
+    rfm = rfm.drop(columns=["first_purchase", "last_purchase"])
+    return rfm
+
+
+@pytest.fixture
+def with_single_orders(transactions):
+    # Customers with one invoice take the purchase_span_days branch.
+    first = transactions.drop_duplicates("CustomerID").head(20).copy()
+    first["CustomerID"] = first["CustomerID"] + 1_000_000
+    return pd.concat([transactions, first], ignore_index=True)
+
+
+def test_rfm_features_match_apply_implementation(with_single_orders):
+    snapshot_date = with_single_orders["InvoiceDate"].max() + pd.Timedelta(days=1)
+    expected = _apply_rfm_features(with_single_orders, snapshot_date)
+    assert (expected["frequency"] == 1).any()
+    pd.testing.assert_frame_equal(build_rfm_features(with_single_orders, snapshot_date), expected)
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+from importlib.util import find_spec
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Seconds for a cold import, best of a few runs. Most of it is pandas and
+# scikit-learn; the deferred dependencies below would add seconds more.
+IMPORT_BUDGETS = {"train_pipeline": 3.0, "app.main": 4.0}
+# Imported by the code paths that use them, never at import time.
+DEFERRED_MODULES = ("mlflow", "boto3", "firebase_admin", "xgboost", "duckdb", "yaml")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(sys.modules)}}))
+"""
+
+
+def _cold_import(module: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT / "src"), str(ROOT)]))
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS))
+def test_import_defers_heavy_dependencies(module):
+    if module == "app.main" and (find_spec("fastapi") is None or find_spec("dotenv") is None):
+        pytest.skip("the API dependencies are not installed")
+    runs = [_cold_import(module) for _ in range(3)]
+    loaded = set(runs[0]["modules"])
+    assert not [name for name in DEFERRED_MODULES if name in loaded]
+    assert min(run["seconds"] for run in runs) < IMPORT_BUDGETS[module]
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("xgboost")
+
+from modeling import (  # noqa: E402
+    evaluate_churn_models,
+    evaluate_ltv_model,
+    train_churn_models,
+    train_ltv_model,
+)
+
+
+@pytest.fixture
+def features():
+    rng = np.random.default_rng(1)
+    n = 3000
+    columns = [
+        "recency_days",
+        "frequency",
+        "monetary",
+        "avg_basket_value",
+        "unique_products",
+        "avg_interpurchase_days",
+        "purchase_span_days",
+    ]
+    df = pd.DataFrame(rng.gamma(2, 1, (n, len(columns))), columns=columns)
+    df["churn_label"] = (df["recency_days"] + rng.normal(0, 1, n) > 2).astype(int)
+    df["future_spend"] = np.maximum(0, 3 * df["monetary"] - 2 * df["recency_days"] + rng.normal(0, 3, n))
+    return df
+
+
+def test_search_does_not_depend_on_thread_budget(features):
+    # n_threads only sets concurrency: the searched candidates and the chosen
+    # models are the same on any number of cores.
+    runs = []
+    for n_threads in (1, 3):
+        log: dict = {}
+        _, churn_xgb, churn_metrics = train_churn_models(
+            features, 42, n_threads=n_threads, max_estimators=100, search_log=log
+        )
+        ltv_xgb, ltv_metrics = train_ltv_model(
+            features, 42, n_threads=n_threads, max_estimators=100, search_log=log
+        )
+        X = features.iloc[:, :7].to_numpy(np.float32)
+        runs.append((log, churn_xgb.predict_proba(X), ltv_xgb.predict(X), churn_metrics, ltv_metrics))
+
+    (log_1, *outputs_1), (log_3, *outputs_3) = runs
+    for name in ("churn_xgb", "ltv_xgb"):
+        searched_1 = [c["params"] for c in log_1[name]["candidates"]]
+        assert searched_1 == [c["params"] for c in log_3[name]["candidates"]]
+        assert log_1[name]["params"] == log_3[name]["params"]
+    prob_1, spend_1, churn_1, ltv_1 = outputs_1
+    prob_3, spend_3, churn_3, ltv_3 = outputs_3
+    np.testing.assert_allclose(prob_1, prob_3)
+    np.testing.assert_allclose(spend_1, spend_3)
+    assert churn_1 == pytest.approx(churn_3)
+    assert ltv_1 == pytest.approx(ltv_3)
+
+
+def test_evaluate_scores_on_the_training_holdout(features):
+    # Stored models are rescored on the holdout a retrain on these features uses.
+    logreg, churn_xgb, churn_metrics = train_churn_models(features, 42, max_estimators=50)
+    ltv_xgb, ltv_metrics = train_ltv_model(features, 42, max_estimators=50)
+    assert evaluate_churn_models(features, logreg, churn_xgb, 42) == pytest.approx(churn_metrics)
+    assert evaluate_ltv_model(features, ltv_xgb, 42) == pytest.approx(ltv_metrics)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+from columnar import write_columnar, write_columnar_chunks  # noqa: E402
+from features import build_rfm_features, build_time_split_features  # noqa: E402
+from sql_features import SQLFeatureEngine, select_feature_backend  # noqa: E402
+
+
+def _assert_same_features(sql: pd.DataFrame, expected: pd.DataFrame) -> None:
+    assert list(sql.columns) == list(expected.columns)
+    sql = sql.sort_values("CustomerID", ignore_index=True)
+    expected = expected.sort_values("CustomerID", ignore_index=True)
+    # SQL sums may add floats in another order.
+    pd.testing.assert_frame_equal(sql, expected, check_dtype=False, rtol=1e-9)
+
+
+@pytest.fixture(params=["whole", "chunked"])
+def sources(request, tmp_path, transactions):
+    path = tmp_path / "transactions.arrow"
+    if request.param == "whole":
+        write_columnar(transactions, path)
+    else:
+        # As written by the streaming clean cache.
+        bounds = np.linspace(0, len(transactions), 8).astype(int)
+        write_columnar_chunks((transactions.iloc[a:b] for a, b in zip(bounds[:-1], bounds[1:])), path)
+    return [path]
+
+
+def test_rfm_features_match_pandas(sources, transactions):
+    snapshot_date = transactions["InvoiceDate"].max() + pd.Timedelta(days=1)
+    with SQLFeatureEngine(sources, threads=1) as engine:
+        sql = engine.rfm_features(snapshot_date)
+    _assert_same_features(sql, build_rfm_features(transactions, snapshot_date))
+
+
+def test_time_split_features_match_pandas(sources, transactions):
+    cutoff_date = transactions["InvoiceDate"].max() - pd.Timedelta(days=90)
+    with SQLFeatureEngine(sources, threads=1) as engine:
+        sql = engine.time_split_features(cutoff_date, 90, 180)
+    _assert_same_features(sql, build_time_split_features(transactions, cutoff_date, 90, 180))
+
+
+def test_backend_selected_by_size(sources):
+    assert select_feature_backend(sources, min_bytes=1) == "duckdb"
+    assert select_feature_backend(sources, min_bytes=10**12) == "pandas"
+    assert select_feature_backend([], min_bytes=1) == "pandas"
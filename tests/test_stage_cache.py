@@ -0,0 +1,32 @@
+import threading
+
+import joblib
+import numpy as np
+
+from stage_cache import Stage, StagePipeline
+
+
+def test_concurrent_stores_of_one_key_leave_a_whole_entry(tmp_path):
+    # Two jobs of one tenant may finish the same stage at once.
+    pipeline = StagePipeline([Stage("model", lambda: None)], config=None, cache_dir=tmp_path)
+    path = tmp_path / "model" / "key.joblib"
+    outputs = [np.full(200_000, i) for i in range(4)]
+    errors = []
+
+    def store(output):
+        try:
+            for _ in range(30):
+                pipeline._store(path, output)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=store, args=(output,)) for output in outputs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    stored = joblib.load(path)
+    assert any(np.array_equal(stored, output) for output in outputs)
+    assert list(path.parent.glob("*.tmp")) == []
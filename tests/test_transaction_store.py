@@ -0,0 +1,42 @@
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from transaction_store import TransactionStore  # noqa: E402
+
+
+def test_concurrent_appends_keep_every_part(tmp_path, transactions):
+    # Jobs of one tenant appending at once must not reuse a part name.
+    store = TransactionStore(tmp_path / "store")
+    bounds = np.linspace(0, len(transactions), 5).astype(int)
+    batches = [transactions.iloc[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    errors = []
+
+    def append(batch):
+        try:
+            store.append(batch)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=append, args=(batch,)) for batch in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(set(store.parts())) == len(batches)
+    expected = transactions.drop_duplicates()
+    assert store.watermark()["rows"] == len(expected)
+    assert len(store.load()) == len(expected)
+
+
+def test_overlapping_append_adds_only_new_rows(tmp_path, transactions):
+    store = TransactionStore(tmp_path / "store")
+    store.append(transactions.iloc[:3000])
+    added = store.append(transactions.iloc[2000:])
+    assert len(added) == len(transactions.iloc[3000:].drop_duplicates())
+    assert len(store.load()) == len(transactions.drop_duplicates())